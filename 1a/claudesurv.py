@@ -7,25 +7,110 @@ from pygame.locals import *
 import random
 import math
 import time
-
-# Initialize pygame
-pg.init()
+import heapq
+import itertools
+import argparse
+import resource
+import tracemalloc
+import ctypes
+import json
+import hashlib
+import os
+import tempfile
+import multiprocessing
+from multiprocessing import shared_memory
+from collections import OrderedDict
 
 # Game constants
 SCREEN_WIDTH = 1024
 SCREEN_HEIGHT = 768
-FPS = 60
+FPS = 60  # Render rate cap, 0 renders as fast as the machine allows
+SIM_HZ = 30  # Fixed simulation tick rate, independent of FPS
+MAX_CATCHUP_STEPS = 5  # Sim ticks allowed per rendered frame before dropping time
+TIME_SCALE = 1.0  # >1 runs the simulation faster than real time (soak tests)
 FOV = 90
 NEAR_CLIP = 0.1
 FAR_CLIP = 1000.0
+DRAW_DISTANCE = 300.0  # Objects further than this are culled even inside FAR_CLIP
 PLAYER_HEIGHT = 1.8
 PLAYER_SPEED = 0.1
-MOUSE_SENSITIVITY = 0.2
+MOUSE_SENSITIVITY = 0.2  # Degrees per pixel of mouse movement
+
+# Items have dense integer IDs so an inventory is just a count per ID.
+# Unknown items are registered on first use, like object types.
+ITEM_NAMES = ["axe", "pick-axe", "knife", "canteen", "water", "wood", "stone", "rope", "scrap_metal",
+              "nails", "meat", "leather", "fat", "cooked_meat", "purified_water", "grass",
+              "campfire", "crafting_table", "forge"]
+ITEM_IDS = {name: i for i, name in enumerate(ITEM_NAMES)}
+
+def item_id(item):
+    iid = ITEM_IDS.get(item)
+    if iid is None:
+        iid = ITEM_IDS[item] = len(ITEM_NAMES)
+        ITEM_NAMES.append(item)
+    return iid
+
+# Count vector indexed by item ID, with the dict-style access the rest of
+# the game uses (inventory["wood"], .get, .items, .update). Every item with
+# a slot in the vector is present, even at a count of 0, so `in` and .get()
+# behave like a dict that was stored a 0. Indexing an item without a slot
+# reads 0, like a Counter. items() is the one place zero means absent: it
+# lists only the items actually held.
+class Inventory:
+    def __init__(self, items=None):
+        self.counts = np.zeros(len(ITEM_NAMES), dtype=np.int64)
+        if items:
+            self.update(items)
+    
+    def _index(self, item):
+        iid = item_id(item)
+        if iid >= len(self.counts):
+            self.resize(len(ITEM_NAMES))
+        return iid
+    
+    def resize(self, n):
+        # Grow to cover at least n item IDs
+        if n > len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros(n - len(self.counts), dtype=np.int64)])
+    
+    def _slot(self, item):
+        # Index of item's count, or None if this inventory has no slot for it
+        iid = ITEM_IDS.get(item)
+        return iid if iid is not None and iid < len(self.counts) else None
+    
+    def __getitem__(self, item):
+        iid = self._slot(item)
+        return int(self.counts[iid]) if iid is not None else 0
+    
+    def __setitem__(self, item, amount):
+        iid = self._index(item)
+        self.counts[iid] = amount
+    
+    def __contains__(self, item):
+        return self._slot(item) is not None
+    
+    def get(self, item, default=None):
+        iid = self._slot(item)
+        return int(self.counts[iid]) if iid is not None else default
+    
+    def add(self, item, amount=1):
+        iid = self._index(item)
+        self.counts[iid] += amount
+    
+    def update(self, items):
+        for item, amount in items.items():
+            self[item] = amount
+    
+    def items(self):
+        # (item, amount) for every item held
+        for iid in np.flatnonzero(self.counts).tolist():
+            yield ITEM_NAMES[iid], int(self.counts[iid])
 
 # Game state variables
 player_pos = [0, PLAYER_HEIGHT, 0]
+player_prev_pos = list(player_pos)  # Position at the start of the last sim tick, for interpolation
 player_rot = [0, 0]  # [horizontal, vertical] rotation in degrees
-player_inventory = {
+player_inventory = Inventory({
     "axe": 1,
     "pick-axe": 1,
     "knife": 1,
@@ -41,7 +126,7 @@ player_inventory = {
     "fat": 0,
     "cooked_meat": 0,
     "purified_water": 0
-}
+})
 player_health = 100
 player_hunger = 100
 player_thirst = 100
@@ -50,159 +135,1726 @@ player_quick_bar = ["axe", "pick-axe", "knife", "canteen", None, None, None, Non
 selected_slot = 0
 show_inventory = False
 crafting_menu_open = False
-cooking_items = {}  # {item_id: end_time}
 player_near_campfire = False
+nearby_campfire = None  # The campfire player_near_campfire refers to
+sim_time = 0.0  # Seconds of simulated time
 
-# Game objects
+# Object types are stored as small integer IDs
+OBJECT_TYPES = [None, "tree", "rock", "water", "grass", "metal", "nails", "barrel", "animal",
+                "building", "container", "campfire", "crafting_table", "forge"]
+TYPE_IDS = {name: i for i, name in enumerate(OBJECT_TYPES)}
+CONTAINER_TYPES = ("barrel", "container")
+
+def type_id(obj_type):
+    # New types are registered on first use
+    tid = TYPE_IDS.get(obj_type)
+    if tid is None:
+        tid = TYPE_IDS[obj_type] = len(OBJECT_TYPES)
+        OBJECT_TYPES.append(obj_type)
+    return tid
+
+FLAG_COLLIDE = 1
+FLAG_INTERACTABLE = 2
+FLAG_ALIVE = 4  # Cleared when a row is removed; the row goes on the free list
+NEAREST_SCAN_LIMIT = 64  # Above this many objects of a type, nearest_of_type uses the spatial grid
+
+# Every world object is one row of typed, contiguous arrays (about 18 bytes
+# per object). Loot dicts and models are sparse side tables, so only
+# containers pay for a contents dict. GameObject handles are created on
+# demand as views onto a row. Removed rows are tombstoned and reused.
+# Released rows (harvested resources) are tombstoned too but keep their
+# position, size and type in a per-type list until revived in place.
+class WorldStore:
+    def __init__(self, capacity=1024):
+        self.count = 0  # Rows in use, including tombstones
+        self.live = 0
+        self.free = []  # Tombstoned rows ready for reuse
+        self.released = {}  # {type id: {index: flags}} rows waiting to be revived
+        self.positions = np.zeros((capacity, 3), dtype=np.float32)
+        self.sizes = np.zeros(capacity, dtype=np.float32)
+        self.type_ids = np.zeros(capacity, dtype=np.uint8)
+        self.flags = np.zeros(capacity, dtype=np.uint8)
+        self.contents = {}  # {index: {item: amount}}, containers only
+        self.models = {}  # {index: model}, only when one is set
+        self.animals = {}  # {index: Animal} - animal handles carry herd state, so they are kept
+        self.by_type = {}  # {type id: {index: None}} live rows per type, kept in step with add/remove
+    
+    def __len__(self):
+        return self.live
+    
+    def __iter__(self):
+        for i in self.alive():
+            yield self.handle(int(i))
+    
+    def _grow(self):
+        capacity = len(self.sizes) * 2
+        for name in ("positions", "sizes", "type_ids", "flags"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+    
+    def add(self, position, size, tid, flags):
+        if self.free:
+            i = self.free.pop()
+        else:
+            if self.count == len(self.sizes):
+                self._grow()
+            i = self.count
+            self.count += 1
+        self.live += 1
+        self.positions[i] = position
+        self.sizes[i] = size
+        self.type_ids[i] = tid
+        self.flags[i] = flags | FLAG_ALIVE
+        self.by_type.setdefault(tid, {})[i] = None
+        return i
+    
+    def extend(self, positions, sizes, tids, flags):
+        # Append rows in bulk (free rows are not reused); returns the first index
+        n = len(sizes)
+        while self.count + n > len(self.sizes):
+            self._grow()
+        start = self.count
+        end = start + n
+        self.positions[start:end] = positions
+        self.sizes[start:end] = sizes
+        self.type_ids[start:end] = tids
+        self.flags[start:end] = flags | FLAG_ALIVE
+        self.count = end
+        self.live += n
+        for tid in np.unique(tids).tolist():
+            rows = (np.flatnonzero(tids == tid) + start).tolist()
+            self.by_type.setdefault(tid, {}).update(dict.fromkeys(rows))
+        return start
+    
+    def reindex(self):
+        # Rebuild the per-type index after the arrays were filled directly
+        self.by_type = {}
+        alive = self.alive()
+        tids = self.type_ids[alive]
+        for tid in np.unique(tids).tolist():
+            self.by_type[tid] = dict.fromkeys(alive[tids == tid].tolist())
+    
+    def remove(self, index):
+        if not self.flags[index] & FLAG_ALIVE:
+            # A released row gives up its revival and becomes a plain free row
+            if self.released.get(int(self.type_ids[index]), {}).pop(index, None) is not None:
+                self.contents.pop(index, None)
+                self.models.pop(index, None)
+                self.free.append(index)
+            return
+        self.flags[index] = 0
+        self.by_type[int(self.type_ids[index])].pop(index, None)
+        self.contents.pop(index, None)
+        self.models.pop(index, None)
+        self.animals.pop(index, None)
+        self.free.append(index)
+        self.live -= 1
+    
+    def release(self, index):
+        # Tombstone a row but keep it for revive(); O(1) like remove
+        if not self.flags[index] & FLAG_ALIVE:
+            return
+        tid = int(self.type_ids[index])
+        self.released.setdefault(tid, {})[index] = int(self.flags[index]) & ~FLAG_ALIVE
+        self.flags[index] = 0
+        self.by_type[tid].pop(index, None)
+        self.animals.pop(index, None)
+        self.live -= 1
+    
+    def revive(self, index):
+        # Bring a released row back with its old position, size, type and flags
+        tid = int(self.type_ids[index])
+        flags = self.released.get(tid, {}).pop(index, None)
+        if flags is None:
+            return False
+        self.flags[index] = flags | FLAG_ALIVE
+        self.by_type.setdefault(tid, {})[index] = None
+        self.live += 1
+        return True
+    
+    def is_alive(self, index):
+        return bool(self.flags[index] & FLAG_ALIVE)
+    
+    def alive(self):
+        return np.nonzero(self.flags[:self.count] & FLAG_ALIVE)[0]
+    
+    def handle(self, index):
+        animal = self.animals.get(index)
+        return animal if animal is not None else GameObject.view(self, index)
+    
+    def handles(self, indices):
+        animals = self.animals
+        view = GameObject.view
+        for i in indices.tolist() if isinstance(indices, np.ndarray) else indices:
+            animal = animals.get(i)
+            yield animal if animal is not None else view(self, i)
+    
+    def with_flag(self, flag):
+        return np.nonzero(self.flags[:self.count] & flag)[0]
+    
+    def of_type(self, obj_type):
+        # Live rows of a type, O(matches)
+        rows = self.by_type.get(TYPE_IDS.get(obj_type), ())
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+    
+    def nearest_of_type(self, obj_type, pos, radius, grid=None):
+        # Nearest live object of a type with distance < radius + its size.
+        # Rare types are scanned directly; common ones go through grid (a
+        # SpatialGrid holding them) when one is given.
+        tid = TYPE_IDS.get(obj_type)
+        rows = self.by_type.get(tid)
+        if not rows:
+            return None
+        pos = np.asarray(pos, dtype=np.float64)
+        if grid is not None and len(rows) > NEAREST_SCAN_LIMIT:
+            best, best_dist = None, math.inf
+            for obj in grid.candidates(pos, radius):
+                if obj.store is self and obj.index in rows:
+                    dist = float(np.linalg.norm(obj.position - pos))
+                    if dist < radius + obj.size and dist < best_dist:
+                        best, best_dist = obj, dist
+            return best
+        indices = self.of_type(obj_type)
+        if tid == TYPE_IDS["animal"]:
+            positions = np.array([self.animals[i].position for i in indices.tolist()])  # Live in the herd
+        else:
+            positions = self.positions[indices]
+        dist = np.linalg.norm(positions - pos, axis=1)
+        dist[dist >= radius + self.sizes[indices]] = np.inf
+        nearest = int(np.argmin(dist))
+        return self.handle(int(indices[nearest])) if dist[nearest] < np.inf else None
+
+# Game objects. A GameObject is a lightweight handle (store, row index);
+# constructing one appends a row to the store.
 class GameObject:
-    def __init__(self, position, model, size=1.0, collide=False, interactable=False, obj_type=None):
-        self.position = np.array(position)
-        self.model = model
-        self.size = size
-        self.collide = collide
-        self.interactable = interactable
-        self.type = obj_type
-        self.contents = {}  # For searchable containers
+    __slots__ = ("store", "index")
+    static = True  # Never moves; drawn from cached per-cell buffers
+    
+    def __init__(self, position, model, size=1.0, collide=False, interactable=False, obj_type=None, rng=None, store=None):
+        self.store = store if store is not None else game_objects
+        flags = (FLAG_COLLIDE if collide else 0) | (FLAG_INTERACTABLE if interactable else 0)
+        self.index = self.store.add(position, size, type_id(obj_type), flags)
+        if model is not None:
+            self.store.models[self.index] = model
         
         # If searchable, add random loot
-        if self.type in ["barrel", "container"]:
-            self.generate_loot()
-            
-    def generate_loot(self):
-        # Potential loot with chances
-        possible_loot = {
-            "wood": 0.3,
-            "stone": 0.2,
-            "rope": 0.15,
-            "scrap_metal": 0.25,
-            "nails": 0.2,
-            "meat": 0.1,
-            "water": 0.25
-        }
-        
-        # Generate 1-3 items
-        num_items = random.randint(1, 3)
-        for _ in range(num_items):
-            item = random.choice(list(possible_loot.keys()))
-            chance = possible_loot[item]
-            if random.random() < chance:
-                amount = random.randint(1, 5)
-                if item in self.contents:
-                    self.contents[item] += amount
-                else:
-                    self.contents[item] = amount
+        if obj_type in CONTAINER_TYPES:
+            self.store.contents[self.index] = {}
+            self.generate_loot(rng or random)
+    
+    @classmethod
+    def view(cls, store, index):
+        obj = cls.__new__(cls)
+        obj.store = store
+        obj.index = index
+        return obj
+    
+    def __eq__(self, other):
+        return isinstance(other, GameObject) and other.index == self.index and other.store is self.store
+    
+    def __hash__(self):
+        return hash(self.index)
+    
+    @property
+    def position(self):
+        return self.store.positions[self.index]
+    
+    @position.setter
+    def position(self, value):
+        self.store.positions[self.index] = value
+    
+    @property
+    def size(self):
+        return float(self.store.sizes[self.index])
+    
+    @property
+    def type(self):
+        return OBJECT_TYPES[self.store.type_ids[self.index]]
+    
+    @property
+    def collide(self):
+        return bool(self.store.flags[self.index] & FLAG_COLLIDE)
+    
+    @property
+    def interactable(self):
+        return bool(self.store.flags[self.index] & FLAG_INTERACTABLE)
+    
+    @property
+    def model(self):
+        return self.store.models.get(self.index)
+    
+    @property
+    def contents(self):
+        # Non-containers always report (and keep) no loot
+        return self.store.contents.get(self.index, {})
+    
+    @contents.setter
+    def contents(self, value):
+        if self.index in self.store.contents:
+            self.store.contents[self.index] = value
+    
+    def generate_loot(self, rng=random):
+        contents = self.contents
+        for item, amount in roll_loot(rng).items():
+            contents[item] = contents.get(item, 0) + amount
     
     def draw(self):
-        # Simple placeholder for drawing objects
+        # Immediate-mode fallback, used only when instanced rendering is unavailable
         glPushMatrix()
         glTranslatef(self.position[0], self.position[1], self.position[2])
         glScalef(self.size, self.size, self.size)
+        glColor3f(*OBJECT_COLORS.get(self.type, DEFAULT_COLOR))
         
-        # Different colors for different object types
-        if self.type == "tree":
-            glColor3f(0.0, 0.5, 0.0)  # Green
-        elif self.type == "rock":
-            glColor3f(0.5, 0.5, 0.5)  # Gray
-        elif self.type == "water":
-            glColor3f(0.0, 0.0, 0.7)  # Blue
-        elif self.type == "grass":
-            glColor3f(0.0, 0.7, 0.0)  # Light green
-        elif self.type == "animal":
-            glColor3f(0.8, 0.4, 0.0)  # Brown
-        elif self.type == "metal":
-            glColor3f(0.6, 0.6, 0.7)  # Metal color
-        elif self.type == "barrel":
-            glColor3f(0.5, 0.3, 0.0)  # Brown
-        elif self.type == "building":
-            glColor3f(0.7, 0.7, 0.7)  # Light gray
-        elif self.type == "container":
-            glColor3f(0.6, 0.4, 0.2)  # Wooden box color
-        elif self.type == "campfire":
-            glColor3f(0.8, 0.2, 0.0)  # Orange-red
-        elif self.type == "crafting_table":
-            glColor3f(0.6, 0.3, 0.0)  # Dark wood
-        elif self.type == "forge":
-            glColor3f(0.4, 0.4, 0.4)  # Dark gray
-        else:
-            glColor3f(1.0, 1.0, 1.0)  # White default
-        
-        # Draw simple cube for now - would be replaced with proper models
         glBegin(GL_QUADS)
-        
-        # Front face
-        glVertex3f(-1.0, -1.0, 1.0)
-        glVertex3f(1.0, -1.0, 1.0)
-        glVertex3f(1.0, 1.0, 1.0)
-        glVertex3f(-1.0, 1.0, 1.0)
-        
-        # Back face
-        glVertex3f(-1.0, -1.0, -1.0)
-        glVertex3f(-1.0, 1.0, -1.0)
-        glVertex3f(1.0, 1.0, -1.0)
-        glVertex3f(1.0, -1.0, -1.0)
-        
-        # Left face
-        glVertex3f(-1.0, -1.0, -1.0)
-        glVertex3f(-1.0, -1.0, 1.0)
-        glVertex3f(-1.0, 1.0, 1.0)
-        glVertex3f(-1.0, 1.0, -1.0)
-        
-        # Right face
-        glVertex3f(1.0, -1.0, -1.0)
-        glVertex3f(1.0, 1.0, -1.0)
-        glVertex3f(1.0, 1.0, 1.0)
-        glVertex3f(1.0, -1.0, 1.0)
-        
-        # Top face
-        glVertex3f(-1.0, 1.0, -1.0)
-        glVertex3f(-1.0, 1.0, 1.0)
-        glVertex3f(1.0, 1.0, 1.0)
-        glVertex3f(1.0, 1.0, -1.0)
-        
-        # Bottom face
-        glVertex3f(-1.0, -1.0, -1.0)
-        glVertex3f(1.0, -1.0, -1.0)
-        glVertex3f(1.0, -1.0, 1.0)
-        glVertex3f(-1.0, -1.0, 1.0)
-        
+        for vertex in CUBE_QUADS:
+            glVertex3f(*vertex)
         glEnd()
         glPopMatrix()
 
-# Animal class that extends GameObject
+def roll_loot(rng):
+    # Potential loot with chances
+    possible_loot = {
+        "wood": 0.3,
+        "stone": 0.2,
+        "rope": 0.15,
+        "scrap_metal": 0.25,
+        "nails": 0.2,
+        "meat": 0.1,
+        "water": 0.25
+    }
+    
+    # Generate 1-3 items
+    contents = {}
+    num_items = rng.randint(1, 3)
+    for _ in range(num_items):
+        item = rng.choice(list(possible_loot.keys()))
+        chance = possible_loot[item]
+        if rng.random() < chance:
+            amount = rng.randint(1, 5)
+            contents[item] = contents.get(item, 0) + amount
+    return contents
+
+# Different colors for different object types
+OBJECT_COLORS = {
+    "tree": (0.0, 0.5, 0.0),  # Green
+    "rock": (0.5, 0.5, 0.5),  # Gray
+    "water": (0.0, 0.0, 0.7),  # Blue
+    "grass": (0.0, 0.7, 0.0),  # Light green
+    "animal": (0.8, 0.4, 0.0),  # Brown
+    "metal": (0.6, 0.6, 0.7),  # Metal color
+    "barrel": (0.5, 0.3, 0.0),  # Brown
+    "building": (0.7, 0.7, 0.7),  # Light gray
+    "container": (0.6, 0.4, 0.2),  # Wooden box color
+    "campfire": (0.8, 0.2, 0.0),  # Orange-red
+    "crafting_table": (0.6, 0.3, 0.0),  # Dark wood
+    "forge": (0.4, 0.4, 0.4),  # Dark gray
+}
+DEFAULT_COLOR = (1.0, 1.0, 1.0)  # White default
+
+# Simple cube for now - would be replaced with proper models
+CUBE_QUADS = [
+    # Front face
+    (-1.0, -1.0, 1.0), (1.0, -1.0, 1.0), (1.0, 1.0, 1.0), (-1.0, 1.0, 1.0),
+    # Back face
+    (-1.0, -1.0, -1.0), (-1.0, 1.0, -1.0), (1.0, 1.0, -1.0), (1.0, -1.0, -1.0),
+    # Left face
+    (-1.0, -1.0, -1.0), (-1.0, -1.0, 1.0), (-1.0, 1.0, 1.0), (-1.0, 1.0, -1.0),
+    # Right face
+    (1.0, -1.0, -1.0), (1.0, 1.0, -1.0), (1.0, 1.0, 1.0), (1.0, -1.0, 1.0),
+    # Top face
+    (-1.0, 1.0, -1.0), (-1.0, 1.0, 1.0), (1.0, 1.0, 1.0), (1.0, 1.0, -1.0),
+    # Bottom face
+    (-1.0, -1.0, -1.0), (1.0, -1.0, -1.0), (1.0, -1.0, 1.0), (-1.0, -1.0, 1.0),
+]
+# Same cube split into triangles for the vertex buffer
+CUBE_TRIANGLES = np.array(
+    [CUBE_QUADS[q + i] for q in range(0, len(CUBE_QUADS), 4) for i in (0, 1, 2, 0, 2, 3)],
+    dtype=np.float32)
+
+# Animal class that extends GameObject. Position, direction and speed live in
+# the AnimalHerd arrays so the whole population can be stepped at once.
+# The store row of an animal keeps its spawn point; the herd owns the live position.
 class Animal(GameObject):
-    def __init__(self, position, model, size=1.0, animal_type="deer"):
-        super().__init__(position, model, size, True, True, "animal")
+    __slots__ = ("herd", "herd_index", "animal_type")
+    static = False
+    
+    def __init__(self, position, model, size=1.0, animal_type="deer", herd=None, store=None):
+        self.herd = herd if herd is not None else animal_herd
+        self.herd_index = self.herd.add(self, position, size)
+        super().__init__(position, model, size, True, True, "animal", store=store)
+        self.store.animals[self.index] = self
         self.animal_type = animal_type
-        self.speed = random.uniform(0.01, 0.05)
-        self.direction = np.array([random.uniform(-1, 1), 0, random.uniform(-1, 1)])
-        self.direction = self.direction / np.linalg.norm(self.direction)
-        self.last_direction_change = time.time()
-    
-    def update(self, game_objects):
-        # Change direction randomly
-        if time.time() - self.last_direction_change > random.uniform(3, 10):
-            self.direction = np.array([random.uniform(-1, 1), 0, random.uniform(-1, 1)])
-            self.direction = self.direction / np.linalg.norm(self.direction)
-            self.last_direction_change = time.time()
-        
-        # Move in the current direction
-        new_pos = self.position + self.direction * self.speed
-        
-        # Check for collisions
-        can_move = True
-        for obj in game_objects:
-            if obj != self and obj.collide:
-                distance = np.linalg.norm(new_pos - obj.position)
-                if distance < (self.size + obj.size) * 0.8:
-                    can_move = False
+    
+    @classmethod
+    def adopt(cls, store, indices, animal_type="deer", herd=None):
+        # Handles for animal rows already in store, added to the herd in one batch
+        herd = herd if herd is not None else animal_herd
+        animals = []
+        for index in indices:
+            animal = cls.view(store, index)
+            animal.herd = herd
+            animal.animal_type = animal_type
+            store.animals[index] = animal
+            animals.append(animal)
+        first = herd.add_many(animals, store.positions[indices], store.sizes[indices])
+        for herd_index, animal in enumerate(animals, first):
+            animal.herd_index = herd_index
+        return animals
+    
+    @property
+    def position(self):
+        return self.herd.positions[self.herd_index]
+    
+    @position.setter
+    def position(self, value):
+        self.herd.positions[self.herd_index] = value
+    
+    @property
+    def direction(self):
+        return self.herd.directions[self.herd_index]
+    
+    @property
+    def speed(self):
+        return self.herd.speeds[self.herd_index]
+
+# Uniform spatial hash over the XZ plane. Each cell holds the objects whose
+# centre falls inside it; queries widen their search by the largest object
+# size seen so big objects in neighbouring cells are still found.
+class SpatialGrid:
+    def __init__(self, cell_size=8.0):
+        self.cell_size = cell_size
+        self.cells = {}  # {(cx, cz): {obj: None}} - dicts keep insertion order
+        self.object_cells = {}  # {obj: (cx, cz)}
+        self.max_size = 0.0
+        self.version = 0  # Bumped on insert/remove so callers can tell when cached results are stale
+    
+    def cell_key(self, x, z):
+        return (int(math.floor(x / self.cell_size)), int(math.floor(z / self.cell_size)))
+    
+    def __len__(self):
+        return len(self.object_cells)
+    
+    def __contains__(self, obj):
+        return obj in self.object_cells
+    
+    def insert(self, obj):
+        key = self.cell_key(obj.position[0], obj.position[2])
+        self.cells.setdefault(key, {})[obj] = None
+        self.object_cells[obj] = key
+        self.version += 1
+        if obj.size > self.max_size:
+            self.max_size = obj.size
+    
+    def insert_many(self, objects, positions, sizes):
+        # Bulk insert; positions/sizes are the objects' rows as arrays
+        if not len(objects):
+            return
+        cells = np.floor(positions[:, [0, 2]] / self.cell_size).astype(np.int64)
+        grid_cells = self.cells
+        object_cells = self.object_cells
+        for obj, key in zip(objects, zip(cells[:, 0].tolist(), cells[:, 1].tolist())):
+            cell = grid_cells.get(key)
+            if cell is None:
+                cell = grid_cells[key] = {}
+            cell[obj] = None
+            object_cells[obj] = key
+        self.version += 1
+        self.max_size = max(self.max_size, float(sizes.max()))
+    
+    def remove(self, obj):
+        key = self.object_cells.pop(obj, None)
+        if key is None:
+            return
+        self.version += 1
+        cell = self.cells[key]
+        del cell[obj]
+        if not cell:
+            del self.cells[key]
+    
+    def update(self, obj):
+        # Call after obj.position changes; only touches the cells if it crossed a boundary
+        old_key = self.object_cells.get(obj)
+        if old_key is None:
+            return  # Not indexed by this grid
+        new_key = self.cell_key(obj.position[0], obj.position[2])
+        if old_key == new_key:
+            return
+        cell = self.cells[old_key]
+        del cell[obj]
+        if not cell:
+            del self.cells[old_key]
+        self.cells.setdefault(new_key, {})[obj] = None
+        self.object_cells[obj] = new_key
+    
+    def candidates(self, pos, radius):
+        # Every object whose cell overlaps the search square (radius + max_size)
+        reach = radius + self.max_size
+        min_cx, min_cz = self.cell_key(pos[0] - reach, pos[2] - reach)
+        max_cx, max_cz = self.cell_key(pos[0] + reach, pos[2] + reach)
+        cells = self.cells
+        for cx in range(min_cx, max_cx + 1):
+            for cz in range(min_cz, max_cz + 1):
+                cell = cells.get((cx, cz))
+                if cell:
+                    yield from cell
+    
+    def collides(self, pos, radius, scale=1.0, ignore=None):
+        # Whether any object's bounding sphere overlaps a sphere of `radius`
+        # at pos: distance < (radius + obj.size) * scale
+        x, y, z = float(pos[0]), float(pos[1]), float(pos[2])
+        for obj in self.candidates(pos, radius):
+            if ignore is not None and obj == ignore:
+                continue
+            p = obj.position
+            dx, dy, dz = p[0] - x, p[1] - y, p[2] - z
+            limit = (radius + obj.size) * scale
+            if dx * dx + dy * dy + dz * dz < limit * limit:
+                return True
+        return False
+
+# Read-only cell index over packed position arrays (CSR layout: objects sorted
+# by cell, plus start/count per occupied cell). Used for batched "does
+# anything overlap" tests where a Python loop per query would be too slow.
+class PackedGrid:
+    def __init__(self, positions, sizes, cell_size=8.0):
+        self.cell_size = cell_size
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        self.sizes = np.asarray(sizes, dtype=np.float64).reshape(-1)
+        self.max_size = float(self.sizes.max()) if len(self.sizes) else 0.0
+        
+        keys = self.cell_keys(self.positions[:, 0], self.positions[:, 2])
+        self.order = np.argsort(keys, kind="stable")
+        self.keys, self.starts, self.counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+    
+    def cell_coords(self, x, z):
+        return np.floor(x / self.cell_size).astype(np.int64), np.floor(z / self.cell_size).astype(np.int64)
+    
+    def cell_keys(self, x, z, offset_x=0, offset_z=0):
+        cx, cz = self.cell_coords(x, z)
+        return ((cx + offset_x) << 32) + ((cz + offset_z) & 0xFFFFFFFF)
+    
+    def any_overlap(self, query_pos, query_size, scale=1.0, exclude=None):
+        # For each query i: is there an object j (j != exclude[i]) with
+        # |query_pos[i] - pos[j]| < (query_size[i] + size[j]) * scale?
+        query_pos = np.asarray(query_pos, dtype=np.float64).reshape(-1, 3)
+        query_size = np.broadcast_to(np.asarray(query_size, dtype=np.float64), (len(query_pos),))
+        hit = np.zeros(len(query_pos), dtype=bool)
+        if len(self.keys) == 0 or len(query_pos) == 0:
+            return hit
+        
+        reach = int(math.ceil((query_size.max() + self.max_size) * scale / self.cell_size))
+        for ox in range(-reach, reach + 1):
+            for oz in range(-reach, reach + 1):
+                qkeys = self.cell_keys(query_pos[:, 0], query_pos[:, 2], ox, oz)
+                slot = np.searchsorted(self.keys, qkeys)
+                slot = np.minimum(slot, len(self.keys) - 1)
+                found = self.keys[slot] == qkeys
+                # Only queries that are still undecided and have an occupied cell
+                todo = np.nonzero(found & ~hit)[0]
+                if len(todo) == 0:
+                    continue
+                starts = self.starts[slot[todo]]
+                counts = self.counts[slot[todo]]
+                lane = np.arange(counts.max())
+                valid = lane[None, :] < counts[:, None]
+                cand = self.order[np.where(valid, starts[:, None] + lane[None, :], 0)]
+                
+                delta = self.positions[cand] - query_pos[todo][:, None, :]
+                dist_sq = np.einsum("ijk,ijk->ij", delta, delta)
+                limit = (query_size[todo][:, None] + self.sizes[cand]) * scale
+                overlap = valid & (dist_sq < limit * limit)
+                if exclude is not None:
+                    overlap &= cand != np.asarray(exclude)[todo][:, None]
+                hit[todo] |= overlap.any(axis=1)
+        return hit
+
+# AI level of detail. Animals near the player step every tick, the middle
+# ring every AI_MID_INTERVAL ticks (staggered, with the elapsed time as the
+# step) and far animals every AI_FAR_INTERVAL ticks with a coarse move that
+# skips collision. Buckets are rebalanced when the player has moved
+# AI_REBALANCE_DISTANCE or every AI_REBALANCE_TICKS, whichever comes first.
+AI_NEAR_RADIUS = 60.0
+AI_MID_RADIUS = 200.0
+AI_MID_INTERVAL = 4
+AI_FAR_INTERVAL = 30
+AI_REBALANCE_DISTANCE = 8.0
+AI_REBALANCE_TICKS = 30
+AI_BUCKETS = ("near", "mid", "far")
+
+# Struct-of-arrays store for every animal in the world. Animal objects are
+# thin views onto one row; step() moves the whole population with array ops.
+class AnimalHerd:
+    COLUMNS = ("positions", "prev_positions", "directions", "speeds", "sizes", "next_turn", "last_step", "lod")
+    
+    def __init__(self, capacity=64, seed=None):
+        self.count = 0
+        self.animals = []
+        self.positions = np.zeros((capacity, 3))
+        self.prev_positions = np.zeros((capacity, 3))  # Positions before the last step, for interpolation
+        self.directions = np.zeros((capacity, 3))
+        self.speeds = np.zeros(capacity)  # Units per second
+        self.sizes = np.zeros(capacity)
+        self.next_turn = np.zeros(capacity)  # Sim time of the next random direction change
+        self.last_step = np.zeros(capacity)  # Sim time each animal was last moved
+        self.lod = np.zeros(capacity, dtype=np.uint8)  # Index into AI_BUCKETS
+        self.lod_center = None  # Player position the buckets were balanced for; None forces a rebalance
+        self.lod_age = 0  # Ticks since the last rebalance
+        self.lod_stats = {bucket: {"count": 0, "updated": 0, "ms": 0.0} for bucket in AI_BUCKETS}
+        self.ticks = 0
+        self.time = 0.0  # Sim time of the last step
+        self.version = 0  # Bumped whenever rows are added or removed
+        self.grid_cells = {}  # {grid: cell of each animal last reported to that grid}
+        self.rng = np.random.default_rng(seed)
+        self.obstacles = PackedGrid(np.zeros((0, 3)), np.zeros(0))
+        self.ground = None  # Terrain the herd walks on, if any
+    
+    def _grow(self):
+        capacity = len(self.speeds) * 2
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+    
+    def random_directions(self, n):
+        directions = np.zeros((n, 3))
+        directions[:, 0] = self.rng.uniform(-1, 1, n)
+        directions[:, 2] = self.rng.uniform(-1, 1, n)
+        length = np.linalg.norm(directions, axis=1, keepdims=True)
+        return directions / np.maximum(length, 1e-9)
+    
+    def add(self, animal, position, size):
+        if self.count == len(self.speeds):
+            self._grow()
+        i = self.count
+        self.count += 1
+        self.animals.append(animal)
+        self.positions[i] = position
+        self.prev_positions[i] = position
+        self.directions[i] = self.random_directions(1)[0]
+        self.speeds[i] = self.rng.uniform(0.6, 3.0)
+        self.sizes[i] = size
+        self.next_turn[i] = self.time + self.rng.uniform(3, 10)
+        self.last_step[i] = self.time
+        self.lod_center = None
+        self.version += 1
+        return i
+    
+    def add_many(self, animals, positions, sizes):
+        # Batch add; returns the herd index of the first animal
+        n = len(animals)
+        while self.count + n > len(self.speeds):
+            self._grow()
+        start = self.count
+        end = start + n
+        self.animals.extend(animals)
+        self.positions[start:end] = positions
+        self.prev_positions[start:end] = positions
+        self.directions[start:end] = self.random_directions(n)
+        self.speeds[start:end] = self.rng.uniform(0.6, 3.0, n)
+        self.sizes[start:end] = sizes
+        self.next_turn[start:end] = self.time + self.rng.uniform(3, 10, n)
+        self.last_step[start:end] = self.time
+        self.count = end
+        self.lod_center = None
+        self.version += 1
+        return start
+    
+    def remove(self, herd_index):
+        # Swap-remove: the last animal takes over the freed row
+        last = self.count - 1
+        moved = self.animals.pop()
+        if herd_index != last:
+            for name in self.COLUMNS:
+                array = getattr(self, name)
+                array[herd_index] = array[last]
+            self.animals[herd_index] = moved
+            moved.herd_index = herd_index
+        self.count = last
+        self.version += 1
+        self.grid_cells.clear()  # Rows shifted; the next sync re-checks every animal
+    
+    def set_obstacles(self, positions, sizes):
+        # Static colliders the herd must walk around; rebuild when that set changes
+        self.obstacles = PackedGrid(positions, sizes)
+    
+    def rebalance(self, center):
+        # Assign every animal to a bucket by XZ distance from center
+        n = self.count
+        delta = self.positions[:n, [0, 2]] - (center[0], center[2])
+        dist_sq = np.einsum("ij,ij->i", delta, delta)
+        lod = self.lod[:n]
+        lod[:] = 2
+        lod[dist_sq < AI_MID_RADIUS * AI_MID_RADIUS] = 1
+        lod[dist_sq < AI_NEAR_RADIUS * AI_NEAR_RADIUS] = 0
+        self.lod_center = (center[0], center[2])
+        self.lod_age = 0
+    
+    def step(self, now, dt, grids=(), center=None):
+        # now and dt are in seconds of sim time. Without a center every
+        # animal is treated as near.
+        self.time = now
+        self.ticks += 1
+        n = self.count
+        if n == 0:
+            return
+        self.lod_age += 1
+        if center is None:
+            self.lod[:n] = 0
+            self.lod_center = None
+        elif (self.lod_center is None or self.lod_age >= AI_REBALANCE_TICKS
+                or math.dist(self.lod_center, (center[0], center[2])) > AI_REBALANCE_DISTANCE):
+            self.rebalance(center)
+        
+        pos = self.positions[:n]
+        self.prev_positions[:n] = pos
+        lod = self.lod[:n]
+        phase = (np.arange(n) + self.ticks)
+        buckets = (
+            np.nonzero(lod == 0)[0],
+            np.nonzero((lod == 1) & (phase % AI_MID_INTERVAL == 0))[0],
+            np.nonzero((lod == 2) & (phase % AI_FAR_INTERVAL == 0))[0],
+        )
+        
+        # Near and mid animals collide with each other as they stood at the
+        # start of the step; far ones are left out of the herd grid
+        start = time.perf_counter()
+        pool = np.nonzero(lod < 2)[0]
+        herd_grid = PackedGrid(pos[pool], self.sizes[pool])
+        elapsed = time.perf_counter() - start
+        
+        moved = []
+        for bucket, active in zip(AI_BUCKETS, buckets):
+            start = time.perf_counter()
+            if len(active):
+                if bucket == "far":
+                    self.coarse_move(active, now)
+                else:
+                    self.move(active, now, herd_grid, np.searchsorted(pool, active))
+                moved.append(active)
+            stats = self.lod_stats[bucket]
+            stats["count"] = int(np.count_nonzero(lod == AI_BUCKETS.index(bucket)))
+            stats["updated"] = len(active)
+            stats["ms"] = (time.perf_counter() - start + (elapsed if bucket == "near" else 0.0)) * 1000.0
+        
+        moved = np.concatenate(moved) if moved else np.zeros(0, dtype=np.int64)
+        if self.ground is not None and len(moved):
+            # Settle everyone who moved onto the terrain in one query; the
+            # collision tests above ran a step's worth of slope behind
+            self.positions[moved, 1] = self.ground.heights_at(self.positions[moved, 0],
+                                                              self.positions[moved, 2]) + ANIMAL_HEIGHT
+        self.sync_grids(grids, moved)
+    
+    def turn(self, active, now):
+        # Random direction changes for every active animal whose timer ran out
+        turning = active[self.next_turn[active] <= now]
+        if len(turning):
+            self.directions[turning] = self.random_directions(len(turning))
+            self.next_turn[turning] = now + self.rng.uniform(3, 10, len(turning))
+    
+    def move(self, active, now, herd_grid, grid_rows):
+        # Full update for the active rows over the time since their last step
+        self.turn(active, now)
+        pos = self.positions[active]
+        direction = self.directions[active]
+        size = self.sizes[active]
+        elapsed = now - self.last_step[active]
+        self.last_step[active] = now
+        
+        # Move everyone, then reject moves that overlap a static collider or
+        # another animal
+        new_pos = pos + direction * (self.speeds[active] * elapsed)[:, None]
+        blocked = self.obstacles.any_overlap(new_pos, size, 0.8)
+        blocked |= herd_grid.any_overlap(new_pos, size, 0.8, exclude=grid_rows)
+        
+        free = ~blocked
+        self.positions[active[free]] = new_pos[free]
+        stuck = active[blocked]
+        if len(stuck):
+            # If collision detected, turn around
+            self.directions[stuck] = -self.directions[stuck]
+            self.next_turn[stuck] = now + self.rng.uniform(3, 10, len(stuck))
+    
+    def coarse_move(self, active, now):
+        # Far away nobody sees collisions; just advance along the heading
+        self.turn(active, now)
+        elapsed = now - self.last_step[active]
+        self.last_step[active] = now
+        self.positions[active] += self.directions[active] * (self.speeds[active] * elapsed)[:, None]
+    
+    def interpolated_positions(self, alpha):
+        # Render-time blend between the last two sim states
+        n = self.count
+        prev = self.prev_positions[:n]
+        return prev + (self.positions[:n] - prev) * alpha
+    
+    def sync_grids(self, grids, moved=None):
+        # Only animals that crossed a cell boundary touch the Python-side
+        # grids. moved limits the check to the rows that moved this step.
+        n = self.count
+        for grid in grids:
+            old = self.grid_cells.get(grid)
+            if old is None or len(old) != n:
+                cells = np.floor(self.positions[:n, [0, 2]] / grid.cell_size).astype(np.int64)
+                changed = range(n)
+            else:
+                cells = old
+                rows = np.arange(n) if moved is None else moved
+                moved_cells = np.floor(self.positions[rows][:, [0, 2]] / grid.cell_size).astype(np.int64)
+                crossed = (moved_cells != old[rows]).any(axis=1)
+                changed = rows[crossed]
+                cells[changed] = moved_cells[crossed]
+            for i in changed:
+                grid.update(self.animals[i])
+            self.grid_cells[grid] = cells
+
+animal_herd = AnimalHerd()
+
+# Optional worker process for the herd AI, so a large herd doesn't eat into
+# the render loop's core. The main process keeps the real herd (its rows,
+# the grids, harvesting) and the worker steps a copy of it, publishing the
+# stepped columns through shared memory. Two buffers alternate: the worker
+# fills whichever one is not the latest, under a sequence number that is -1
+# while writing, so the main process can always copy a finished step without
+# waiting and can tell when the worker lapped it mid-copy. When rows are
+# added or removed the main process sends a new snapshot down a pipe and
+# ignores buffers stepped from an older one until the worker catches up.
+AI_WORKER = False  # Step the herd in a worker process; not deterministic, so never while recording or replaying
+AI_WORKER_COLUMNS = (("positions", 3), ("directions", 3), ("next_turn", 1), ("last_step", 1), ("lod", 1))
+AI_WORKER_STRIDE = sum(width for _, width in AI_WORKER_COLUMNS)
+AI_WORKER_CONTROL = 4  # sim time, player x, y, z (written by the main process)
+AI_WORKER_STATUS = 4  # latest buffer, steps, seconds spent stepping, attached (written by the worker)
+AI_WORKER_HEADER = 4  # seq, generation, count, sim time of the step
+AI_WORKER_IDLE = 0.002  # Seconds the worker waits for new sim time between checks
+AI_WORKER_REPORT = 1.0  # Seconds between step rate updates
+
+def herd_worker_views(buf, capacity):
+    # Float64 views over the shared block: control, status and the two
+    # (header, data) buffers
+    sizes = [AI_WORKER_CONTROL, AI_WORKER_STATUS] + [AI_WORKER_HEADER, capacity * AI_WORKER_STRIDE] * 2
+    values = np.ndarray((sum(sizes),), dtype=np.float64, buffer=buf)
+    control, status, header0, data0, header1, data1 = np.split(values, np.cumsum(sizes)[:-1])
+    return control, status, [(header0, data0.reshape(capacity, AI_WORKER_STRIDE)),
+                             (header1, data1.reshape(capacity, AI_WORKER_STRIDE))]
+
+def pack_herd_columns(herd, data):
+    n = herd.count
+    offset = 0
+    for name, width in AI_WORKER_COLUMNS:
+        data[:n, offset:offset + width] = getattr(herd, name)[:n].reshape(n, width)
+        offset += width
+
+def unpack_herd_columns(herd, data):
+    n = len(data)
+    offset = 0
+    for name, width in AI_WORKER_COLUMNS:
+        column = getattr(herd, name)[:n]
+        column[...] = data[:, offset:offset + width].reshape(column.shape)
+        offset += width
+
+def herd_snapshot(herd, generation):
+    # Everything the worker needs to step a copy of the herd
+    n = herd.count
+    return {
+        "generation": generation,
+        "columns": {name: getattr(herd, name)[:n].copy() for name in AnimalHerd.COLUMNS},
+        "time": herd.time,
+        "ticks": herd.ticks,
+        "rng": herd.rng.bit_generator.state,
+        "terrain_seed": herd.ground.seed if herd.ground is not None else None,
+    }
+
+def herd_from_snapshot(snapshot):
+    columns = snapshot["columns"]
+    n = len(columns["speeds"])
+    herd = AnimalHerd(capacity=max(n, 64))
+    for name, column in columns.items():
+        getattr(herd, name)[:n] = column
+    herd.count = n  # No Animal handles: the worker never touches the grids
+    herd.time = snapshot["time"]
+    herd.ticks = snapshot["ticks"]
+    herd.rng.bit_generator.state = snapshot["rng"]
+    if snapshot["terrain_seed"] is not None:
+        herd.ground = terrain_for(snapshot["terrain_seed"])
+    return herd
+
+def _herd_worker(shm_name, capacity, conn):
+    # Worker process: step the latest herd snapshot every time the main
+    # process's sim time moves on, then publish it
+    shm = shared_memory.SharedMemory(name=shm_name)
+    control, status, buffers = herd_worker_views(shm.buf, capacity)
+    status[3] = 1
+    steps = busy = 0.0
+    herd = None
+    generation = -1
+    obstacles = None
+    seq = 0
+    try:
+        while True:
+            due = herd is not None and control[0] > herd.time
+            if conn.poll(0 if due else AI_WORKER_IDLE):
+                message = conn.recv()
+                if message is None:
                     break
+                kind, payload = message
+                if kind == "rows":
+                    herd = herd_from_snapshot(payload)
+                    generation = payload["generation"]
+                elif kind == "obstacles":
+                    obstacles = PackedGrid(*payload)
+                else:
+                    # The herd outgrew the block; move to the bigger one
+                    del control, status, buffers
+                    shm.close()
+                    shm_name, capacity = payload
+                    shm = shared_memory.SharedMemory(name=shm_name)
+                    control, status, buffers = herd_worker_views(shm.buf, capacity)
+                    status[1:] = (steps, busy, 1)
+                if herd is not None and obstacles is not None:
+                    herd.obstacles = obstacles
+                continue
+            if not due:
+                continue
+            
+            start = time.perf_counter()
+            now = float(control[0])
+            herd.step(now, now - herd.time, (), control[1:4].copy())
+            latest = int(status[0])
+            target = 0 if latest < 0 else 1 - latest
+            header, data = buffers[target]
+            seq += 1
+            header[0] = -1
+            pack_herd_columns(herd, data)
+            header[1:] = (generation, herd.count, now)
+            header[0] = seq
+            status[0] = target
+            steps += 1
+            busy += time.perf_counter() - start
+            status[1:3] = (steps, busy)
+    finally:
+        del control, status, buffers  # The views pin the mapping
+        shm.close()
+
+class HerdWorker:
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.generation = 0  # Bumped for every snapshot sent
+        self.rate = 0.0  # Worker steps per second over the last report window
+        self.step_ms = 0.0  # Mean milliseconds per worker step over that window
+        self.herd = None  # Herd and version the worker's rows came from
+        self.version = -1
+        self.obstacles = None
+        self.window = (time.perf_counter(), 0.0, 0.0)
+        self.shm = None
+        self.retired = []  # Old blocks, unlinked once the worker has attached to the new one
+        self.allocate()
+        
+        # fork is unsafe once SDL and GL are up, so the worker is spawned
+        context = multiprocessing.get_context("spawn")
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_herd_worker, args=(self.shm.name, self.capacity, child), daemon=True)
+        self.process.start()
+        child.close()
+    
+    def allocate(self):
+        # A fresh shared block for the current capacity. The worker may not
+        # have opened the old one yet, so it is only unlinked later.
+        if self.shm is not None:
+            del self.control, self.status, self.buffers
+            self.shm.close()
+            self.retired.append(self.shm)
+        size = 8 * (AI_WORKER_CONTROL + AI_WORKER_STATUS + 2 * (AI_WORKER_HEADER + self.capacity * AI_WORKER_STRIDE))
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.control, self.status, self.buffers = herd_worker_views(self.shm.buf, self.capacity)
+        self.status[0] = -1
+        self.seq = 0  # Sequence number of the last step copied into the herd
+    
+    def release(self):
+        for shm in self.retired:
+            shm.unlink()
+        self.retired = []
+        if self.shm is not None:
+            del self.control, self.status, self.buffers
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+    
+    def stop(self):
+        if self.process is None:
+            return
+        self.conn.send(None)
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        self.release()
+        self.process = None
+    
+    def sync(self, herd, now, center):
+        # Takes the place of herd.step once per sim tick: hand the worker the
+        # new sim time and any changed rows, then copy in its newest finished
+        # step if there is one. Returns whether the herd moved.
+        if herd.count > self.capacity:
+            self.capacity = max(self.capacity * 2, herd.count)
+            self.allocate()
+            self.conn.send(("resize", (self.shm.name, self.capacity)))
+        if self.retired and self.status[3]:
+            for shm in self.retired:
+                shm.unlink()
+            self.retired = []
+        if herd is not self.herd or herd.version != self.version:
+            # Sending blocks at most until the worker finishes its current step
+            self.generation += 1
+            self.conn.send(("rows", herd_snapshot(herd, self.generation)))
+            self.herd, self.version = herd, herd.version
+        if herd.obstacles is not self.obstacles:
+            self.conn.send(("obstacles", (herd.obstacles.positions, herd.obstacles.sizes)))
+            self.obstacles = herd.obstacles
+        self.control[1:] = center
+        self.control[0] = now
+        self.update_rate()
+        return self.read(herd)
+    
+    def read(self, herd):
+        latest = int(self.status[0])
+        if latest < 0:
+            return False
+        header, data = self.buffers[latest]
+        seq, generation, count, step_time = header.tolist()
+        if seq <= self.seq or generation != self.generation or count != herd.count:
+            return False
+        columns = data[:herd.count].copy()
+        if header[0] != seq:
+            return False  # The worker lapped us and rewrote it mid-copy
+        n = herd.count
+        herd.prev_positions[:n] = herd.positions[:n]
+        unpack_herd_columns(herd, columns)
+        herd.time = step_time
+        herd.ticks += 1
+        self.seq = seq
+        return True
+    
+    def update_rate(self, window=AI_WORKER_REPORT):
+        start, steps, busy = self.window
+        now = time.perf_counter()
+        if now - start >= window:
+            total, total_busy = float(self.status[1]), float(self.status[2])
+            if total < steps:
+                return  # The worker hasn't moved to a resized block yet
+            self.rate = (total - steps) / (now - start)
+            self.step_ms = (total_busy - busy) / max(total - steps, 1) * 1000.0
+            self.window = (now, total, total_busy)
+
+herd_worker = None  # HerdWorker while running with AI_WORKER
+
+# Instanced rendering: the cube mesh is uploaded once and every object type
+# gets one buffer of per-instance attributes (position, scale, colour), so a
+# whole type is drawn with a single glDrawArraysInstanced call. Sticks to
+# GLSL 1.20 plus GL 3.3 instancing so it also runs on Mesa's llvmpipe.
+INSTANCE_VERTEX_SHADER = """
+#version 120
+attribute vec3 vertex;
+attribute vec4 instance;  // xyz = position, w = scale
+attribute vec3 color;
+varying vec3 v_color;
+void main() {
+    v_color = color;
+    gl_Position = gl_ModelViewProjectionMatrix * vec4(instance.xyz + vertex * instance.w, 1.0);
+}
+"""
+
+INSTANCE_FRAGMENT_SHADER = """
+#version 120
+varying vec3 v_color;
+void main() {
+    gl_FragColor = vec4(v_color, 1.0);
+}
+"""
+
+INSTANCE_STRIDE = 7  # x, y, z, scale, r, g, b (float32)
+
+def compile_program(vertex_source, fragment_source):
+    program = glCreateProgram()
+    for source, kind in ((vertex_source, GL_VERTEX_SHADER), (fragment_source, GL_FRAGMENT_SHADER)):
+        shader = glCreateShader(kind)
+        glShaderSource(shader, source)
+        glCompileShader(shader)
+        if not glGetShaderiv(shader, GL_COMPILE_STATUS):
+            raise RuntimeError(glGetShaderInfoLog(shader).decode())
+        glAttachShader(program, shader)
+        glDeleteShader(shader)
+    glLinkProgram(program)
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        raise RuntimeError(glGetProgramInfoLog(program).decode())
+    return program
+
+# All static instances of one object type in a render cell. Rows are kept
+# packed (swap-remove); the GPU copy is only touched when the set changes,
+# and then only for the range of rows that changed.
+class InstanceBatch:
+    def __init__(self, obj_type, capacity=64):
+        self.color = OBJECT_COLORS.get(obj_type, DEFAULT_COLOR)
+        self.data = np.zeros((capacity, INSTANCE_STRIDE), dtype=np.float32)
+        self.objects = []
+        self.slots = {}  # {obj: row}
+        self.vbo = None
+        self.gpu_capacity = 0
+        self.dirty_lo = self.dirty_hi = 0
+    
+    def __len__(self):
+        return len(self.objects)
+    
+    def mark_dirty(self, lo, hi):
+        if self.dirty_lo == self.dirty_hi:
+            self.dirty_lo, self.dirty_hi = lo, hi
+        else:
+            self.dirty_lo = min(self.dirty_lo, lo)
+            self.dirty_hi = max(self.dirty_hi, hi)
+    
+    def add(self, obj):
+        row = len(self.objects)
+        if row == len(self.data):
+            self.data = np.resize(self.data, (row * 2, INSTANCE_STRIDE))
+        self.objects.append(obj)
+        self.slots[obj] = row
+        self.data[row, :3] = obj.position
+        self.data[row, 3] = obj.size
+        self.data[row, 4:] = self.color
+        self.mark_dirty(row, row + 1)
+        return row
+    
+    def remove(self, obj):
+        row = self.slots.pop(obj)
+        last = len(self.objects) - 1
+        moved = self.objects.pop()
+        if row != last:
+            self.objects[row] = moved
+            self.slots[moved] = row
+            self.data[row] = self.data[last]
+            self.mark_dirty(row, row + 1)
+        return moved if row != last else None
+    
+    def upload(self):
+        if self.vbo is None:
+            self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        if self.gpu_capacity < len(self.data):
+            # Buffer grew - reallocate and send everything
+            glBufferData(GL_ARRAY_BUFFER, self.data.nbytes, self.data, GL_STATIC_DRAW)
+            self.gpu_capacity = len(self.data)
+        elif self.dirty_lo < self.dirty_hi:
+            lo, hi = self.dirty_lo, min(self.dirty_hi, len(self.objects))
+            if lo < hi:
+                glBufferSubData(GL_ARRAY_BUFFER, lo * self.data.itemsize * INSTANCE_STRIDE, self.data[lo:hi])
+        self.dirty_lo = self.dirty_hi = 0
+
+# Camera maths mirroring the glRotatef/glTranslatef calls in render_scene,
+# so culling and picking agree with what is actually on screen
+def rotation_matrix(angle, x, y, z):
+    c = math.cos(math.radians(angle))
+    s = math.sin(math.radians(angle))
+    return np.array([
+        [x * x * (1 - c) + c, x * y * (1 - c) - z * s, x * z * (1 - c) + y * s, 0],
+        [y * x * (1 - c) + z * s, y * y * (1 - c) + c, y * z * (1 - c) - x * s, 0],
+        [x * z * (1 - c) - y * s, y * z * (1 - c) + x * s, z * z * (1 - c) + c, 0],
+        [0, 0, 0, 1],
+    ])
+
+def camera_view_matrix(pos, rot):
+    translate = np.identity(4)
+    translate[:3, 3] = [-pos[0], -pos[1], -pos[2]]
+    return rotation_matrix(-rot[1], 1, 0, 0) @ rotation_matrix(-rot[0], 0, 1, 0) @ translate
+
+def perspective_matrix(fov, aspect, near, far):
+    f = 1.0 / math.tan(math.radians(fov) / 2)
+    return np.array([
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ])
+
+def frustum_planes(pos, rot, fov, aspect, near, far):
+    # Six (a, b, c, d) planes with normals pointing inwards, from the rows of
+    # the combined clip matrix (Gribb/Hartmann)
+    clip = perspective_matrix(fov, aspect, near, far) @ camera_view_matrix(pos, rot)
+    planes = np.array([
+        clip[3] + clip[0], clip[3] - clip[0],  # Left, right
+        clip[3] + clip[1], clip[3] - clip[1],  # Bottom, top
+        clip[3] + clip[2], clip[3] - clip[2],  # Near, far
+    ])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+def sphere_in_frustum(planes, center, radius):
+    for a, b, c, d in planes:
+        if a * center[0] + b * center[1] + c * center[2] + d < -radius:
+            return False
+    return True
+
+# A coarse square of the world with its own per-type instance batches, so a
+# whole cell is accepted or rejected by the culling test without visiting
+# the objects inside it
+RENDER_CELL_SIZE = 32.0
+
+class RenderCell:
+    def __init__(self, key):
+        self.key = key
+        self.batches = {}  # {obj_type: InstanceBatch}
+        self.count = 0
+        self.lo = np.full(3, np.inf)
+        self.hi = np.full(3, -np.inf)
+    
+    def grow_bounds(self, lo, hi):
+        np.minimum(self.lo, lo, out=self.lo)
+        np.maximum(self.hi, hi, out=self.hi)
+    
+    def bounding_sphere(self):
+        center = (self.lo + self.hi) * 0.5
+        return center, float(np.linalg.norm(self.hi - self.lo)) * 0.5
+
+class InstancedRenderer:
+    def __init__(self, cell_size=RENDER_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # {(cx, cz): RenderCell}
+        self.object_cells = {}  # {obj: (cx, cz)}, static objects only
+        self.dynamic_data = np.zeros((0, INSTANCE_STRIDE), dtype=np.float32)
+        self.stats = {"cells_drawn": 0, "drawn": 0, "culled": 0}
+        self.supported = False
+        try:
+            self.program = compile_program(INSTANCE_VERTEX_SHADER, INSTANCE_FRAGMENT_SHADER)
+            self.vertex_loc = glGetAttribLocation(self.program, "vertex")
+            self.instance_loc = glGetAttribLocation(self.program, "instance")
+            self.color_loc = glGetAttribLocation(self.program, "color")
+            self.cube_vbo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.cube_vbo)
+            glBufferData(GL_ARRAY_BUFFER, CUBE_TRIANGLES.nbytes, CUBE_TRIANGLES, GL_STATIC_DRAW)
+            self.dynamic_vbo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            self.supported = bool(glVertexAttribDivisor) and bool(glDrawArraysInstanced)
+        except Exception as e:
+            print(f"Instanced rendering unavailable, falling back to immediate mode: {e}")
+    
+    def __len__(self):
+        return len(self.object_cells)
+    
+    def cell_key(self, x, z):
+        return (int(math.floor(x / self.cell_size)), int(math.floor(z / self.cell_size)))
+    
+    def add(self, obj):
+        # Dynamic objects are streamed from the herd every frame instead
+        if not obj.static:
+            return
+        key = self.cell_key(obj.position[0], obj.position[2])
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = RenderCell(key)
+        batch = cell.batches.get(obj.type)
+        if batch is None:
+            batch = cell.batches[obj.type] = InstanceBatch(obj.type)
+        batch.add(obj)
+        cell.count += 1
+        cell.grow_bounds(obj.position - obj.size, obj.position + obj.size)
+        self.object_cells[obj] = key
+    
+    def remove(self, obj):
+        key = self.object_cells.pop(obj, None)
+        if key is None:
+            return
+        cell = self.cells[key]
+        cell.batches[obj.type].remove(obj)
+        cell.count -= 1
+        if cell.count == 0:
+            del self.cells[key]
+    
+    def visible_cells(self, planes, eye, draw_distance):
+        # Visit only cells inside the draw distance square, or every cell if
+        # there are fewer of those than squares to probe
+        reach = int(math.ceil(draw_distance / self.cell_size))
+        min_cx, min_cz = self.cell_key(eye[0] - draw_distance, eye[2] - draw_distance)
+        if len(self.cells) < (2 * reach + 2) ** 2:
+            candidates = self.cells.values()
+        else:
+            candidates = (self.cells[key] for key in (
+                (cx, cz) for cx in range(min_cx, min_cx + 2 * reach + 2) for cz in range(min_cz, min_cz + 2 * reach + 2))
+                if key in self.cells)
+        
+        visible = []
+        for cell in candidates:
+            center, radius = cell.bounding_sphere()
+            dx, dz = center[0] - eye[0], center[2] - eye[2]
+            if math.sqrt(dx * dx + dz * dz) - radius > draw_distance:
+                continue
+            if sphere_in_frustum(planes, center, radius):
+                visible.append(cell)
+        return visible
+    
+    def visible_herd(self, pos, size, planes, eye, draw_distance):
+        # Cull the whole herd with one vectorised sphere-vs-frustum test
+        inside = (planes[:, :3] @ pos.T + planes[:, 3:] >= -size).all(axis=0)
+        dx = pos[:, 0] - eye[0]
+        dz = pos[:, 2] - eye[2]
+        inside &= np.sqrt(dx * dx + dz * dz) - size <= draw_distance
+        return np.nonzero(inside)[0]
+    
+    def draw(self, planes, eye, draw_distance, herd=None, alpha=1.0):
+        cells = self.visible_cells(planes, eye, draw_distance)
+        drawn = sum(cell.count for cell in cells)
+        total = len(self.object_cells)
+        
+        visible_animals = np.zeros(0, dtype=np.int64)
+        if herd is not None and herd.count:
+            herd_positions = herd.interpolated_positions(alpha)
+            visible_animals = self.visible_herd(herd_positions, herd.sizes[:herd.count], planes, eye, draw_distance)
+            drawn += len(visible_animals)
+            total += herd.count
+        self.stats["cells_drawn"] = len(cells)
+        self.stats["drawn"] = drawn
+        self.stats["culled"] = total - drawn
         
-        if can_move:
-            self.position = new_pos
+        if not self.supported:
+            for cell in cells:
+                for batch in cell.batches.values():
+                    for obj in batch.objects:
+                        obj.draw()
+            for i in visible_animals:
+                herd.animals[i].draw()
+            return
+        
+        glUseProgram(self.program)
+        glBindBuffer(GL_ARRAY_BUFFER, self.cube_vbo)
+        glEnableVertexAttribArray(self.vertex_loc)
+        glVertexAttribPointer(self.vertex_loc, 3, GL_FLOAT, GL_FALSE, 0, None)
+        glEnableVertexAttribArray(self.instance_loc)
+        glEnableVertexAttribArray(self.color_loc)
+        glVertexAttribDivisor(self.instance_loc, 1)
+        glVertexAttribDivisor(self.color_loc, 1)
+        
+        stride = INSTANCE_STRIDE * 4
+        for cell in cells:
+            for batch in cell.batches.values():
+                if not batch.objects:
+                    continue
+                batch.upload()
+                glVertexAttribPointer(self.instance_loc, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(0))
+                glVertexAttribPointer(self.color_loc, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(16))
+                glDrawArraysInstanced(GL_TRIANGLES, 0, len(CUBE_TRIANGLES), len(batch.objects))
+        
+        # Dynamic objects: pack the visible animals and stream them in one upload
+        if len(visible_animals):
+            k = len(visible_animals)
+            if len(self.dynamic_data) < k:
+                self.dynamic_data = np.zeros((max(k, 2 * len(self.dynamic_data)), INSTANCE_STRIDE), dtype=np.float32)
+            data = self.dynamic_data[:k]
+            data[:, :3] = herd_positions[visible_animals]
+            data[:, 3] = herd.sizes[visible_animals]
+            data[:, 4:] = OBJECT_COLORS["animal"]
+            glBindBuffer(GL_ARRAY_BUFFER, self.dynamic_vbo)
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STREAM_DRAW)
+            glVertexAttribPointer(self.instance_loc, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(0))
+            glVertexAttribPointer(self.color_loc, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(16))
+            glDrawArraysInstanced(GL_TRIANGLES, 0, len(CUBE_TRIANGLES), k)
+        
+        glVertexAttribDivisor(self.instance_loc, 0)
+        glVertexAttribDivisor(self.color_loc, 0)
+        glDisableVertexAttribArray(self.vertex_loc)
+        glDisableVertexAttribArray(self.instance_loc)
+        glDisableVertexAttribArray(self.color_loc)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glUseProgram(0)
+
+def build_grids(store):
+    # Collision and interaction grids over the store, sharing one set of handles
+    indices = store.with_flag(FLAG_COLLIDE | FLAG_INTERACTABLE)
+    handles = list(store.handles(indices))
+    grids = []
+    for flag in (FLAG_COLLIDE, FLAG_INTERACTABLE):
+        mask = store.flags[indices] & flag != 0
+        grid = SpatialGrid()
+        grid.insert_many(list(itertools.compress(handles, mask.tolist())),
+                         store.positions[indices[mask]], store.sizes[indices[mask]])
+        grids.append(grid)
+    return grids
+
+# Caches the interactable under the crosshair for the on-screen prompt. The
+# pick is only redone once the player has moved or turned a meaningful
+# amount, the set of interactables changed, or the cached answer is a few
+# frames old (animals wander in and out of view on their own).
+INTERACT_REACH = 2  # Interaction range beyond the object's own size
+PROMPT_REQUERY_DISTANCE = 0.25
+PROMPT_REQUERY_ANGLE = 1.0  # Degrees
+PROMPT_MAX_AGE = 10  # Frames
+
+class InteractionPromptCache:
+    def __init__(self, bvh):
+        self.bvh = bvh
+        self.pos = None
+        self.rot = None
+        self.version = -1
+        self.age = 0
+        self.target = None
+    
+    def target_at(self, pos, rot):
+        self.age += 1
+        if (self.pos is None or self.version != self.bvh.grid.version or self.age > PROMPT_MAX_AGE
+                or math.dist(self.pos, pos) > PROMPT_REQUERY_DISTANCE
+                or max(abs(self.rot[0] - rot[0]), abs(self.rot[1] - rot[1])) > PROMPT_REQUERY_ANGLE):
+            self.target = look_target(pos, rot)
+            self.pos = tuple(pos)
+            self.rot = tuple(rot)
+            self.version = self.bvh.grid.version
+            self.age = 0
+        return self.target
+
+def view_direction(rot):
+    # Unit vector the camera looks along: the view matrix's -Z row
+    return -camera_view_matrix((0, 0, 0), rot)[2, :3]
+
+# Bounding-volume hierarchy over the bounding spheres of a SpatialGrid's
+# objects, for look-at picking. Objects are sorted along a Morton curve and
+# cut into leaves of BVH_LEAF_SIZE, and the leaves sit at the bottom of an
+# implicit complete binary tree (node i has children 2i and 2i+1), so build,
+# refit and traversal are all whole-level array ops. Objects are kept in
+# step through insert/remove, called just before the grid changes: a removed
+# object empties its slot, a new one (streamed chunk, respawned animal)
+# takes the next slot in an empty leaf, so a chunk's objects share leaves,
+# and the tree doubles when no empty leaf is left. Harvested resources keep
+# their slot for the respawn. Touched leaves are refit on the next pick, as
+# are those of animals the herd moved. The tree is only rebuilt once
+# BVH_REBUILD_FRACTION of it has changed that way, or if the grid changed
+# behind its back.
+BVH_LEAF_SIZE = 8
+BVH_REBUILD_FRACTION = 0.5
+BVH_REBUILD_MIN = 1024  # Changes always allowed before a rebuild, for small worlds
+
+class SphereBVH:
+    def __init__(self, grid, herd=None):
+        self.grid = grid
+        self.herd = herd
+        self.version = -1  # grid.version the tree is in step with
+        self.herd_tick = -1  # herd.ticks the dynamic spheres were refit for
+        self.herd_version = -1  # herd.version the dynamic herd rows were read at
+        self.objects = []  # Per slot, None where empty
+        self.items = {}  # {obj: slot}
+        self.vacated = {}  # {obj: slot} held by remove(keep_slot=True)
+        self.dynamic = {}  # {slot: obj} for objects that move
+        self.dirty = set()  # Leaves to refit before the next pick
+        self.changes = 0  # Slots taken or given up since the last build
+        self.rebuilds = 0
+        self.refits = 0
+    
+    def build(self):
+        objects = list(self.grid.object_cells)
+        n = len(objects)
+        centers = np.array([obj.position for obj in objects], dtype=np.float64).reshape(-1, 3)
+        radii = np.array([obj.size for obj in objects], dtype=np.float64)
+        
+        # Morton order over the XZ bounds (Y spread is tiny in this world)
+        if n:
+            lo, hi = centers.min(axis=0), centers.max(axis=0)
+            cells = ((centers[:, [0, 2]] - lo[[0, 2]]) / np.maximum(hi[[0, 2]] - lo[[0, 2]], 1e-9) * 65535).astype(np.uint64)
+            codes = np.zeros(n, dtype=np.uint64)
+            for bit in range(16):
+                for axis in range(2):
+                    codes |= ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + axis)
+            order = np.argsort(codes, kind="stable")
+        else:
+            order = np.zeros(0, dtype=np.int64)
+        self.objects = [objects[i] for i in order.tolist()]
+        self.items = {obj: i for i, obj in enumerate(self.objects)}
+        self.vacated = {}
+        self.dynamic = {i: obj for i, obj in enumerate(self.objects) if not obj.static}
+        self.dynamic_slots = None  # Arrays over self.dynamic, read on the next refresh
+        self.dirty = set()
+        self.changes = 0
+        
+        # Leaves padded to a power of two; empty leaves get inverted bounds
+        leaves = max(1, -(-n // BVH_LEAF_SIZE))
+        self.leaf_base = 1 << (leaves - 1).bit_length()
+        slots = self.leaf_base * BVH_LEAF_SIZE
+        self.objects.extend([None] * (slots - n))
+        self.centers = np.zeros((slots, 3))
+        self.centers[:n] = centers[order]
+        self.radii = np.zeros(slots)
+        self.radii[:n] = radii[order]
+        leaf_items = np.full(slots, -1, dtype=np.int64)
+        leaf_items[:n] = np.arange(n)
+        self.leaf_items = leaf_items.reshape(self.leaf_base, BVH_LEAF_SIZE)  # Slot number, -1 where empty
+        self.next_slot = n  # Where the next inserted object goes
+        self.lo = np.full((2 * self.leaf_base, 3), np.inf)
+        self.hi = np.full((2 * self.leaf_base, 3), -np.inf)
+        self.refit_leaves(np.arange(self.leaf_base))
+        self.version = self.grid.version
+        self.herd_tick = self.herd.ticks if self.herd is not None else -1
+        self.rebuilds += 1
+    
+    def refit_leaves(self, leaves):
+        # Recompute the given leaves from their spheres, then their ancestors
+        items = self.leaf_items[leaves]
+        valid = items >= 0
+        safe = np.where(valid, items, 0)
+        lo = self.centers[safe] - self.radii[safe][..., None]
+        hi = self.centers[safe] + self.radii[safe][..., None]
+        nodes = leaves + self.leaf_base
+        self.lo[nodes] = np.where(valid[..., None], lo, np.inf).min(axis=1)
+        self.hi[nodes] = np.where(valid[..., None], hi, -np.inf).max(axis=1)
+        nodes = np.unique(nodes >> 1)
+        while len(nodes) and nodes[-1] >= 1:
+            self.lo[nodes] = np.minimum(self.lo[2 * nodes], self.lo[2 * nodes + 1])
+            self.hi[nodes] = np.maximum(self.hi[2 * nodes], self.hi[2 * nodes + 1])
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes >> 1)
+    
+    def grow(self):
+        # Double the leaf count; existing slots keep their numbers
+        slots = len(self.objects)
+        self.leaf_base *= 2
+        self.objects.extend([None] * slots)
+        self.centers = np.concatenate([self.centers, np.zeros_like(self.centers)])
+        self.radii = np.concatenate([self.radii, np.zeros_like(self.radii)])
+        self.leaf_items = np.concatenate([self.leaf_items, np.full_like(self.leaf_items, -1)])
+        self.lo = np.full((2 * self.leaf_base, 3), np.inf)
+        self.hi = np.full((2 * self.leaf_base, 3), -np.inf)
+        self.refit_leaves(np.arange(self.leaf_base))
+    
+    def take_slot(self):
+        # Next free slot of the leaf being filled, or the first slot of the
+        # next empty leaf, so objects inserted together share leaves
+        slot = self.next_slot
+        if slot % BVH_LEAF_SIZE == 0 or slot >= len(self.objects) or self.objects[slot] is not None:
+            empty = np.flatnonzero((self.leaf_items < 0).all(axis=1))
+            if not len(empty):
+                self.grow()
+                empty = np.flatnonzero((self.leaf_items < 0).all(axis=1))
+            later = empty[empty >= slot // BVH_LEAF_SIZE]
+            slot = int((later if len(later) else empty)[0]) * BVH_LEAF_SIZE
+        self.next_slot = slot + 1
+        return slot
+    
+    def insert(self, obj):
+        # Call just before adding obj to the grid
+        if self.version != self.grid.version or obj in self.grid or obj in self.items:
+            return
+        slot = self.vacated.pop(obj, None)
+        if slot is None or self.objects[slot] is not None:
+            slot = self.take_slot()
+            self.changes += 1
+        self.objects[slot] = obj
+        self.items[obj] = slot
+        self.centers[slot] = obj.position
+        self.radii[slot] = obj.size
+        self.leaf_items.flat[slot] = slot
+        if not obj.static:
+            self.dynamic[slot] = obj
+            self.dynamic_slots = None
+        self.dirty.add(slot // BVH_LEAF_SIZE)
+        self.version += 1
+    
+    def remove(self, obj, keep_slot=False):
+        # Call just before removing obj from the grid. keep_slot holds its
+        # slot for when the same object is inserted again (a respawn).
+        if self.version != self.grid.version or obj not in self.grid:
+            return
+        slot = self.items.pop(obj)
+        self.objects[slot] = None
+        self.leaf_items.flat[slot] = -1
+        if self.dynamic.pop(slot, None) is not None:
+            self.dynamic_slots = None
+        if keep_slot:
+            self.vacated[obj] = slot
         else:
-            # If collision detected, change direction
-            self.direction = -self.direction
-            self.last_direction_change = time.time()
+            self.changes += 1
+        self.dirty.add(slot // BVH_LEAF_SIZE)
+        self.version += 1
+    
+    def refresh(self):
+        if (self.version != self.grid.version
+                or self.changes > BVH_REBUILD_FRACTION * max(len(self.items), BVH_REBUILD_MIN)):
+            self.build()
+            return
+        leaves = self.dirty
+        if self.dynamic and self.herd is not None and self.herd_tick != self.herd.ticks:
+            # Animals only move; refit the leaves of those that did (far
+            # ones are stepped rarely under AI LOD). Herd rows shift when
+            # animals leave it, so they are re-read whenever it changed.
+            if self.dynamic_slots is None or self.herd_version != self.herd.version:
+                self.dynamic_slots = np.fromiter(self.dynamic, dtype=np.int64, count=len(self.dynamic))
+                self.dynamic_herd_rows = np.array([obj.herd_index for obj in self.dynamic.values()], dtype=np.int64)
+                self.herd_version = self.herd.version
+            positions = self.herd.positions[self.dynamic_herd_rows]
+            moved = (positions != self.centers[self.dynamic_slots]).any(axis=1)
+            if moved.any():
+                self.centers[self.dynamic_slots[moved]] = positions[moved]
+                leaves = leaves.union((self.dynamic_slots[moved] // BVH_LEAF_SIZE).tolist())
+            self.herd_tick = self.herd.ticks
+        if leaves:
+            self.refit_leaves(np.unique(np.fromiter(leaves, dtype=np.int64, count=len(leaves))))
+            self.dirty = set()
+            self.refits += 1
+    
+    def pick(self, origin, direction, max_distance):
+        # First sphere hit by the ray within max_distance, or None
+        self.refresh()
+        if not self.items:
+            return None
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        safe = np.where(np.abs(direction) < 1e-12, 1e-12, direction)
+        inverse = 1.0 / safe
+        
+        # Walk down one level at a time, keeping nodes whose box the ray enters
+        nodes = np.array([1])
+        while nodes[0] < self.leaf_base:
+            t1 = (self.lo[nodes] - origin) * inverse
+            t2 = (self.hi[nodes] - origin) * inverse
+            near = np.minimum(t1, t2).max(axis=1)
+            far = np.maximum(t1, t2).min(axis=1)
+            nodes = nodes[(far >= np.maximum(near, 0.0)) & (near <= max_distance)]
+            if not len(nodes):
+                return None
+            nodes = np.concatenate([2 * nodes, 2 * nodes + 1])
+        
+        # Ray against the spheres in the surviving leaves
+        items = self.leaf_items[nodes - self.leaf_base].ravel()
+        items = items[items >= 0]
+        offset = self.centers[items] - origin
+        along = offset @ direction
+        miss_sq = np.einsum("ij,ij->i", offset, offset) - along * along
+        radius_sq = self.radii[items] ** 2
+        half_chord = np.sqrt(np.maximum(radius_sq - miss_sq, 0.0))
+        entry = np.maximum(along - half_chord, 0.0)  # 0 when the origin is inside the sphere
+        hit = (miss_sq <= radius_sq) & (along + half_chord >= 0.0) & (entry <= max_distance)
+        if not hit.any():
+            return None
+        # Nearest entry wins. Spheres around the origin all enter at 0, so
+        # those go by how far ahead along the ray their centre is, centres
+        # behind the player last.
+        entry[~hit] = np.inf
+        ahead = np.where(along >= 0.0, along, np.inf)
+        return self.objects[items[np.lexsort((-along, ahead, entry))[0]]]
+
+# Min-heap of timed jobs driven by the simulation step. Each job has a key
+# (e.g. (campfire, item instance)) and an owner so the UI can list one
+# campfire's jobs. Cancelled, rescheduled and paused jobs leave stale heap
+# entries behind; those are skipped when popped and compacted away when
+# they outnumber live ones.
+class TimerJob:
+    __slots__ = ("key", "owner", "duration", "due", "callback", "payload", "remaining", "generation")
+    
+    def __init__(self, key, owner, duration, due, callback, payload):
+        self.key = key
+        self.owner = owner
+        self.duration = duration
+        self.due = due
+        self.callback = callback
+        self.payload = payload
+        self.remaining = None  # Set while paused
+        self.generation = -1  # Sequence number of its live heap entry, -1 if none
+    
+    @property
+    def paused(self):
+        return self.remaining is not None
+
+class TimerScheduler:
+    def __init__(self):
+        self.now = 0.0  # Scheduler clock, seconds; stands still while paused
+        self.paused = False
+        self.heap = []  # [(due, seq, key)]
+        self.jobs = {}  # {key: TimerJob}
+        self.by_owner = {}  # {owner: {key: None}}
+        self.seq = itertools.count()
+        self.stale = 0
+    
+    def __len__(self):
+        return len(self.jobs)
+    
+    def _push(self, job):
+        # Sequence numbers are never reused, so an entry left behind by a
+        # replaced job can't be mistaken for its successor under the same key
+        job.generation = next(self.seq)
+        heapq.heappush(self.heap, (job.due, job.generation, job.key))
+    
+    def _invalidate(self, job):
+        if job.generation == -1:
+            return  # Paused jobs have no live heap entry left to count
+        job.generation = -1
+        self.stale += 1
+        if self.stale > 64 and self.stale > len(self.jobs):
+            self.heap = [entry for entry in self.heap
+                         if entry[2] in self.jobs and self.jobs[entry[2]].generation == entry[1]]
+            heapq.heapify(self.heap)
+            self.stale = 0
+    
+    def schedule(self, key, delay, callback, owner=None, payload=None):
+        # Replaces any job already using this key
+        self.cancel(key)
+        job = TimerJob(key, owner, delay, self.now + delay, callback, payload)
+        self.jobs[key] = job
+        self.by_owner.setdefault(owner, {})[key] = None
+        self._push(job)
+        return job
+    
+    def _forget(self, job):
+        del self.jobs[job.key]
+        keys = self.by_owner[job.owner]
+        del keys[job.key]
+        if not keys:
+            del self.by_owner[job.owner]
+    
+    def cancel(self, key):
+        job = self.jobs.get(key)
+        if job is None:
+            return None
+        self._forget(job)
+        self._invalidate(job)
+        return job
+    
+    def pause_job(self, key):
+        job = self.jobs.get(key)
+        if job is None or job.paused:
+            return
+        job.remaining = max(0.0, job.due - self.now)
+        self._invalidate(job)
+    
+    def resume_job(self, key):
+        job = self.jobs.get(key)
+        if job is None or not job.paused:
+            return
+        job.due = self.now + job.remaining
+        job.remaining = None
+        self._push(job)
+    
+    def pause(self):
+        self.paused = True
+    
+    def resume(self):
+        self.paused = False
+    
+    def remaining(self, job):
+        return job.remaining if job.paused else max(0.0, job.due - self.now)
+    
+    def jobs_for(self, owner):
+        return [self.jobs[key] for key in self.by_owner.get(owner, ())]
+    
+    def advance(self, dt):
+        # Move the clock forward and fire every job that came due, in order
+        if self.paused:
+            return
+        self.now += dt
+        heap = self.heap
+        while heap and heap[0][0] <= self.now:
+            _, seq, key = heapq.heappop(heap)
+            job = self.jobs.get(key)
+            if job is None or job.generation != seq:
+                self.stale = max(0, self.stale - 1)
+                continue
+            # Its heap entry is already gone, so this leaves nothing stale
+            self._forget(job)
+            job.callback(job)
+
+sim_timers = TimerScheduler()
 
 # Crafting recipes
 crafting_recipes = {
@@ -214,303 +1866,1504 @@ crafting_recipes = {
     "rope": {"grass": 5}
 }
 
-# Create game world
-def generate_world():
-    objects = []
-    
-    # Add trees
-    for _ in range(50):
-        pos = [random.uniform(-50, 50), 0, random.uniform(-50, 50)]
-        objects.append(GameObject(pos, None, 2.0, True, True, "tree"))
-    
-    # Add rocks
-    for _ in range(30):
-        pos = [random.uniform(-50, 50), 0, random.uniform(-50, 50)]
-        objects.append(GameObject(pos, None, 1.0, True, True, "rock"))
-    
-    # Add water areas
-    for _ in range(5):
-        pos = [random.uniform(-50, 50), -0.5, random.uniform(-50, 50)]
-        objects.append(GameObject(pos, None, 5.0, False, True, "water"))
-    
-    # Add tall grass
-    for _ in range(100):
-        pos = [random.uniform(-50, 50), 0.5, random.uniform(-50, 50)]
-        objects.append(GameObject(pos, None, 0.5, False, True, "grass"))
-    
-    # Add scrap metal
-    for _ in range(20):
-        pos = [random.uniform(-50, 50), 0.2, random.uniform(-50, 50)]
-        objects.append(GameObject(pos, None, 0.5, False, True, "metal"))
-    
-    # Add nails
-    for _ in range(25):
-        pos = [random.uniform(-50, 50), 0.1, random.uniform(-50, 50)]
-        objects.append(GameObject(pos, None, 0.2, False, True, "nails"))
-    
-    # Add barrels
-    for _ in range(15):
-        pos = [random.uniform(-50, 50), 0.5, random.uniform(-50, 50)]
-        objects.append(GameObject(pos, None, 1.0, True, True, "barrel"))
-    
-    # Add animals (deer)
-    for _ in range(10):
-        pos = [random.uniform(-50, 50), 0.5, random.uniform(-50, 50)]
-        objects.append(Animal(pos, None, 1.0, "deer"))
+# Recipes compiled into a requirements matrix (one row per recipe, one
+# column per item ID), so how many times every recipe can be crafted from an
+# inventory is a single vectorized floor-divide and min. The matrix is
+# mostly zeros, so the divide only runs over its nonzero entries.
+class RecipeBook:
+    def __init__(self, recipes):
+        self.names = list(recipes)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.outputs = np.array([item_id(name) for name in self.names], dtype=np.int64)
+        for requirements in recipes.values():
+            for item in requirements:
+                item_id(item)
+        self.requirements = np.zeros((len(self.names), len(ITEM_NAMES)), dtype=np.int64)
+        for row, requirements in enumerate(recipes.values()):
+            for item, amount in requirements.items():
+                self.requirements[row, ITEM_IDS[item]] = amount
+        rows, self.columns = np.nonzero(self.requirements)  # Row-major, so grouped by recipe
+        self.amounts = self.requirements[rows, self.columns]
+        self.has_requirements = np.bincount(rows, minlength=len(self.names)) > 0
+        self.row_starts = np.searchsorted(rows, np.flatnonzero(self.has_requirements))
+    
+    def __len__(self):
+        return len(self.names)
+    
+    def craftable_counts(self, inventory):
+        # Times each recipe can be crafted. Recipes with no requirements
+        # report the largest int64.
+        inventory.resize(self.requirements.shape[1])
+        times = np.full(len(self.names), np.iinfo(np.int64).max, dtype=np.int64)
+        if len(self.amounts):
+            per_item = inventory.counts[self.columns] // self.amounts
+            times[self.has_requirements] = np.minimum.reduceat(per_item, self.row_starts)
+        return times
+    
+    def craftable(self, inventory):
+        # {recipe: times} for every recipe that can be crafted at least once
+        counts = self.craftable_counts(inventory)
+        return {self.names[row]: int(counts[row]) for row in np.flatnonzero(counts).tolist()}
+    
+    def craft(self, inventory, recipe, times=1):
+        # Craft up to times copies; returns how many were made
+        row = self.ids[recipe]
+        width = self.requirements.shape[1]
+        inventory.resize(width)
+        made = min(times, int(self.craftable_counts(inventory)[row]))
+        if made > 0:
+            inventory.counts[:width] -= self.requirements[row] * made
+            inventory.counts[self.outputs[row]] += made
+        return made
+
+recipe_book = RecipeBook(crafting_recipes)
+
+# Create game world. The world is split into square chunks, each generated
+# from the world seed and its chunk coordinate alone, so any chunk can be
+# (re)built on its own in any order. Spawn counts are per 100x100 area of
+# the original layout and scaled to the chunk's area.
+CHUNK_SIZE = 64.0
+LOAD_RADIUS = 2  # Chunks around the player that are kept loaded
+UNLOAD_RADIUS = 3  # Chunks further than this are evicted
+WORLD_HALF_SIZE = 50
+BASE_WORLD_OBJECTS = 270
+BASE_AREA = 100.0 * 100.0
+
+ANIMAL_HEIGHT = 0.5  # Animal centres stay this far above the terrain
+
+# (type, count per base area, size, collide, interactable, y above the terrain)
+WORLD_SPAWNS = [
+    ("tree", 50, 2.0, True, True, 0),
+    ("rock", 30, 1.0, True, True, 0),
+    ("water", 5, 5.0, False, True, -0.5),
+    ("grass", 100, 0.5, False, True, 0.5),  # Tall grass
+    ("metal", 20, 0.5, False, True, 0.2),  # Scrap metal
+    ("nails", 25, 0.2, False, True, 0.1),
+    ("barrel", 15, 1.0, True, True, 0.5),
+    ("animal", 10, 1.0, True, True, ANIMAL_HEIGHT),  # Deer
+]
+BUILDINGS_PER_BASE_AREA = 5
+
+# Terrain: a sum of value-noise octaves, sampled every TERRAIN_SPACING metres
+# into a heightmap. The ground is the bilinear interpolation of that
+# heightmap, which is what height_at answers and (up to float32) what the
+# mesh shows. Lattice values come from an integer hash of the seed, octave
+# and lattice point, so any sample can be computed alone and in any order,
+# like chunks.
+TERRAIN_SPACING = 2.0  # Metres between heightmap samples
+TERRAIN_OCTAVES = ((400.0, 16.0), (120.0, 5.0), (40.0, 1.5), (16.0, 0.4))  # (wavelength, amplitude) in metres
+TERRAIN_TILE_CACHE = 256  # Heightmap tiles (one per chunk) kept for height_at
+TERRAIN_SKIRT_DEPTH = 6.0  # Tile edges hang this far down to hide LOD cracks
+TERRAIN_LOD_DISTANCES = (96.0, 192.0, 384.0)  # Beyond each, tiles use every 2nd, 4th, 8th sample
+TERRAIN_LOD_STEPS = (1, 2, 4, 8)
+TERRAIN_LIGHT = np.array([0.4, 0.8, 0.3]) / np.linalg.norm([0.4, 0.8, 0.3])
+TERRAIN_WAVELENGTHS = np.array([wavelength for wavelength, _ in TERRAIN_OCTAVES])[:, None]
+TERRAIN_AMPLITUDES = np.array([amplitude for _, amplitude in TERRAIN_OCTAVES])[:, None]
+TERRAIN_CORNER_DX = np.array([0, 1, 0, 1])[None, :, None]
+TERRAIN_CORNER_DZ = np.array([0, 0, 1, 1])[None, :, None]
+
+def lattice_values(seed, octave, ix, iz):
+    # Hash integer lattice points to [0, 1), vectorised over octave, ix and iz
+    h = (np.asarray(ix, dtype=np.int64).astype(np.uint32) * np.uint32(0x9E3779B1)
+         ^ np.asarray(iz, dtype=np.int64).astype(np.uint32) * np.uint32(0x85EBCA77)
+         ^ np.asarray(octave, dtype=np.uint32) * np.uint32(0xC2B2AE3D)
+         ^ np.uint32((seed * 0x27D4EB2F + 0x165667B1) & 0xFFFFFFFF))
+    h ^= h >> np.uint32(16)
+    h *= np.uint32(0x7FEB352D)
+    h ^= h >> np.uint32(15)
+    h *= np.uint32(0x846CA68B)
+    h ^= h >> np.uint32(16)
+    return (h >> np.uint32(8)).astype(np.float64) / float(1 << 24)
+
+def smoothstep(t):
+    return t * t * (3.0 - 2.0 * t)
+
+def terrain_noise(seed, x, z):
+    # Noise height at arbitrary points; every octave and lattice corner is
+    # one array op
+    x, z = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(z, dtype=np.float64))
+    shape = x.shape
+    fx = x.reshape(1, -1) / TERRAIN_WAVELENGTHS  # (octaves, points)
+    fz = z.reshape(1, -1) / TERRAIN_WAVELENGTHS
+    ix, iz = np.floor(fx), np.floor(fz)
+    u, v = smoothstep(fx - ix), smoothstep(fz - iz)
+    octaves = np.arange(len(TERRAIN_OCTAVES))[:, None, None]
+    v00, v10, v01, v11 = lattice_values(seed, octaves, ix.astype(np.int64)[:, None, :] + TERRAIN_CORNER_DX,
+                                        iz.astype(np.int64)[:, None, :] + TERRAIN_CORNER_DZ).transpose(1, 0, 2)
+    value = (v00 * (1.0 - u) + v10 * u) * (1.0 - v) + (v01 * (1.0 - u) + v11 * u) * v
+    return ((2.0 * value - 1.0) * TERRAIN_AMPLITUDES).sum(axis=0).reshape(shape)
+
+def lattice_weights(coords, wavelength):
+    # Dense (len(coords), lattice lines) smoothstep weights, and the first line
+    f = coords / wavelength
+    base = np.floor(f)
+    t = smoothstep(f - base)
+    first = int(base[0])
+    lines = base.astype(np.int64) - first
+    weights = np.zeros((len(coords), int(lines[-1]) + 2))
+    rows = np.arange(len(coords))
+    weights[rows, lines] = 1.0 - t
+    weights[rows, lines + 1] = t
+    return weights, first
+
+def terrain_grid(seed, x0, z0, nx, nz, spacing=TERRAIN_SPACING):
+    # terrain_noise on a regular nx by nz grid. Each octave is separable, so
+    # it is two small matrix products over the octave's lattice instead of
+    # a hash per sample; equal to terrain_noise up to rounding.
+    xs = x0 + np.arange(nx) * spacing
+    zs = z0 + np.arange(nz) * spacing
+    height = np.zeros((nx, nz))
+    for octave, (wavelength, amplitude) in enumerate(TERRAIN_OCTAVES):
+        wx, first_x = lattice_weights(xs, wavelength)
+        wz, first_z = lattice_weights(zs, wavelength)
+        lattice = lattice_values(seed, octave, np.arange(first_x, first_x + wx.shape[1])[:, None],
+                                 np.arange(first_z, first_z + wz.shape[1])[None, :])
+        height += (wx @ (2.0 * lattice - 1.0) @ wz.T) * amplitude
+    return height
+
+def terrain_heights(seed, x, z, spacing=TERRAIN_SPACING):
+    # Ground height at arbitrary points: bilinear over the heightmap samples
+    fx = np.asarray(x, dtype=np.float64) / spacing
+    fz = np.asarray(z, dtype=np.float64) / spacing
+    ix, iz = np.floor(fx), np.floor(fz)
+    u, v = fx - ix, fz - iz
+    corners = terrain_noise(seed, np.stack([ix, ix + 1, ix, ix + 1]) * spacing,
+                            np.stack([iz, iz, iz + 1, iz + 1]) * spacing)
+    h00, h10, h01, h11 = corners
+    return (h00 * (1.0 - u) + h10 * u) * (1.0 - v) + (h01 * (1.0 - u) + h11 * u) * v
+
+class Terrain:
+    def __init__(self, seed, tile_size=CHUNK_SIZE, spacing=TERRAIN_SPACING):
+        self.seed = seed
+        self.tile_size = tile_size
+        self.spacing = spacing
+        self.cells = int(round(tile_size / spacing))  # Heightmap cells along a tile edge
+        self.tiles = OrderedDict()  # {(tx, tz): (cells + 1, cells + 1) heights}, LRU
+    
+    def tile(self, tx, tz):
+        key = (tx, tz)
+        heights = self.tiles.get(key)
+        if heights is not None:
+            self.tiles.move_to_end(key)
+            return heights
+        n = self.cells
+        ix = np.arange(tx * n, tx * n + n + 1, dtype=np.float64)[:, None]
+        iz = np.arange(tz * n, tz * n + n + 1, dtype=np.float64)[None, :]
+        heights = self.tiles[key] = terrain_noise(self.seed, ix * self.spacing, iz * self.spacing)
+        if len(self.tiles) > TERRAIN_TILE_CACHE:
+            self.tiles.popitem(last=False)
+        return heights
+    
+    def height_at(self, x, z):
+        # Same result as terrain_heights, from a cached tile in a few scalar ops
+        fx, fz = x / self.spacing, z / self.spacing
+        ix, iz = math.floor(fx), math.floor(fz)
+        u, v = fx - ix, fz - iz
+        n = self.cells
+        tx, tz = ix // n, iz // n
+        heights = self.tile(tx, tz)
+        i, j = ix - tx * n, iz - tz * n
+        h00, h10 = heights.item(i, j), heights.item(i + 1, j)
+        h01, h11 = heights.item(i, j + 1), heights.item(i + 1, j + 1)
+        return (h00 * (1.0 - u) + h10 * u) * (1.0 - v) + (h01 * (1.0 - u) + h11 * u) * v
+    
+    def heights_at(self, x, z):
+        return terrain_heights(self.seed, x, z, self.spacing)
+    
+    def meshes(self, tx0, tz0, ntx, ntz):
+        # Vertex arrays for a ntx by ntz block of tiles in one vectorised
+        # pass: {(tx, tz): (vertices, min y, max y)}. Each tile is its
+        # (cells + 1)^2 grid followed by a skirt copy of its edge vertices,
+        # interleaved x, y, z, r, g, b as float32.
+        n = self.cells
+        s = self.spacing
+        nx, nz = ntx * n + 1, ntz * n + 1
+        # One sample of border all round for the normals
+        heights = terrain_grid(self.seed, tx0 * self.tile_size - s, tz0 * self.tile_size - s,
+                               nx + 2, nz + 2, s).astype(np.float32)
+        
+        # Unnormalised normal (-dh/dx, 1, -dh/dz); shade by the light and
+        # blend grass to rock as the slope steepens
+        nxs = (heights[:-2, 1:-1] - heights[2:, 1:-1]) * np.float32(0.5 / s)
+        nzs = (heights[1:-1, :-2] - heights[1:-1, 2:]) * np.float32(0.5 / s)
+        up = 1.0 / np.sqrt(nxs * nxs + nzs * nzs + 1.0)
+        lx, ly, lz = TERRAIN_LIGHT.astype(np.float32)
+        light = 0.45 + 0.55 * np.clip((nxs * lx + ly + nzs * lz) * up, 0.0, 1.0)
+        steep = np.clip((0.9 - up) * 5.0, 0.0, 1.0)
+        
+        grid = np.empty((nx, nz, 6), dtype=np.float32)
+        grid[..., 0] = (tx0 * self.tile_size + np.arange(nx) * s)[:, None]
+        grid[..., 1] = heights[1:-1, 1:-1]
+        grid[..., 2] = (tz0 * self.tile_size + np.arange(nz) * s)[None, :]
+        for channel, (grass, rock) in enumerate(((0.2, 0.45), (0.5, 0.42), (0.2, 0.38)), 3):
+            grid[..., channel] = (grass + (rock - grass) * steep) * light
+        
+        # Gather every tile's window of the grid, then its skirt
+        edge_i, edge_j = terrain_edges(n)
+        local_i = np.concatenate([np.repeat(np.arange(n + 1), n + 1), edge_i])
+        local_j = np.concatenate([np.tile(np.arange(n + 1), n + 1), edge_j])
+        rows = (np.arange(ntx) * n)[:, None, None] + local_i
+        cols = (np.arange(ntz) * n)[None, :, None] + local_j
+        vertices = grid.reshape(-1, 6).take((rows * nz + cols).ravel(), axis=0).reshape(ntx, ntz, -1, 6)
+        vertices[:, :, (n + 1) ** 2:, 1] -= TERRAIN_SKIRT_DEPTH
+        tile_heights = vertices[:, :, :(n + 1) ** 2, 1]
+        low, high = tile_heights.min(axis=2), tile_heights.max(axis=2)
+        return {(tx0 + a, tz0 + b): (vertices[a, b], float(low[a, b]), float(high[a, b]))
+                for a in range(ntx) for b in range(ntz)}
+
+def terrain_edges(n):
+    # Local (i, j) of a tile's edge samples: z = 0, z = n, x = 0, x = n sides
+    line = np.arange(n + 1)
+    ends = np.full(n + 1, n)
+    zeros = np.zeros(n + 1, dtype=np.int64)
+    return np.concatenate([line, line, zeros, ends]), np.concatenate([zeros, ends, line, line])
+
+def terrain_indices(n, step):
+    # Triangle indices for a tile mesh using every step-th sample, with the skirt
+    k = np.arange(0, n, step)
+    i, j = np.meshgrid(k, k, indexing="ij")
+    a = i * (n + 1) + j
+    b = a + step * (n + 1)
+    quads = np.stack([a, b, b + step, a, b + step, a + step], axis=-1).reshape(-1)
+    base = (n + 1) ** 2
+    edge_i, edge_j = terrain_edges(n)
+    skirts = []
+    for side in range(4):
+        side_rows = slice(side * (n + 1), (side + 1) * (n + 1))
+        top = edge_i[side_rows] * (n + 1) + edge_j[side_rows]
+        bottom = base + side * (n + 1) + np.arange(n + 1)
+        t0, t1, b0, b1 = top[k], top[k + step], bottom[k], bottom[k + step]
+        skirts.append(np.stack([t0, t1, b1, t0, b1, b0], axis=-1).reshape(-1))
+    return np.concatenate([quads] + skirts).astype(np.uint16)
+
+_terrains = {}
+
+def terrain_for(seed):
+    # One Terrain (and tile cache) per seed in each process
+    terrain = _terrains.get(seed)
+    if terrain is None:
+        terrain = _terrains[seed] = Terrain(seed)
+    return terrain
+
+# Tile meshes live in one vertex buffer each and share an index buffer per
+# LOD step, since every tile has the same layout. Tiles are meshed in blocks
+# as they come within draw distance and dropped once well outside it.
+class TerrainRenderer:
+    def __init__(self):
+        self.terrain = None
+        self.chunks = {}  # {(tx, tz): (vbo, bounding sphere centre, radius)}
+        self.index_buffers = None  # [(ibo, index count)] per TERRAIN_LOD_STEPS
+        self.stats = {"tiles_drawn": 0, "triangles": 0}
+    
+    def clear(self):
+        if self.chunks:
+            glDeleteBuffers(len(self.chunks), [vbo for vbo, _, _ in self.chunks.values()])
+        self.chunks = {}
+    
+    def upload(self, terrain, keys):
+        tx = [key[0] for key in keys]
+        tz = [key[1] for key in keys]
+        tx0, tz0 = min(tx), min(tz)
+        half = terrain.tile_size / 2
+        for key, (vertices, low, high) in terrain.meshes(tx0, tz0, max(tx) - tx0 + 1, max(tz) - tz0 + 1).items():
+            if key not in keys or key in self.chunks:
+                continue
+            vbo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, vbo)
+            glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+            low -= TERRAIN_SKIRT_DEPTH
+            center = (key[0] * terrain.tile_size + half, (low + high) / 2, key[1] * terrain.tile_size + half)
+            self.chunks[key] = (vbo, center, math.sqrt(2 * half * half + ((high - low) / 2) ** 2))
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+    
+    def draw(self, terrain, planes, eye, draw_distance):
+        if terrain is not self.terrain:
+            self.clear()
+            self.terrain = terrain
+        if self.index_buffers is None:
+            self.index_buffers = []
+            for step in TERRAIN_LOD_STEPS:
+                indices = terrain_indices(terrain.cells, step)
+                ibo = glGenBuffers(1)
+                glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ibo)
+                glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+                self.index_buffers.append((ibo, len(indices)))
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        
+        # Tiles whose XZ square comes within the draw distance
+        size = terrain.tile_size
+        reach = int(math.ceil(draw_distance / size))
+        ex, ez = int(math.floor(eye[0] / size)), int(math.floor(eye[2] / size))
+        wanted = {}
+        for tx in range(ex - reach, ex + reach + 1):
+            for tz in range(ez - reach, ez + reach + 1):
+                dx = max(tx * size - eye[0], 0.0, eye[0] - (tx + 1) * size)
+                dz = max(tz * size - eye[2], 0.0, eye[2] - (tz + 1) * size)
+                distance = math.sqrt(dx * dx + dz * dz)
+                if distance <= draw_distance:
+                    wanted[(tx, tz)] = distance
+        missing = [key for key in wanted if key not in self.chunks]
+        if missing:
+            self.upload(terrain, missing)
+        stale = [key for key in self.chunks
+                 if max(abs(key[0] - ex), abs(key[1] - ez)) > reach + 1]
+        if stale:
+            glDeleteBuffers(len(stale), [self.chunks.pop(key)[0] for key in stale])
+        
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        tiles = triangles = 0
+        lod_ibo = None
+        for key, distance in wanted.items():
+            vbo, center, radius = self.chunks[key]
+            if not sphere_in_frustum(planes, center, radius):
+                continue
+            lod = sum(distance > limit for limit in TERRAIN_LOD_DISTANCES)
+            ibo, count = self.index_buffers[lod]
+            if ibo != lod_ibo:
+                glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ibo)
+                lod_ibo = ibo
+            glBindBuffer(GL_ARRAY_BUFFER, vbo)
+            glVertexPointer(3, GL_FLOAT, 24, ctypes.c_void_p(0))
+            glColorPointer(3, GL_FLOAT, 24, ctypes.c_void_p(12))
+            glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_SHORT, None)
+            tiles += 1
+            triangles += count // 3
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        self.stats["tiles_drawn"] = tiles
+        self.stats["triangles"] = triangles
+
+def chunk_rng(seed, cx, cz):
+    return random.Random(f"{seed}:{cx}:{cz}")
+
+def generate_chunk(seed, cx, cz, chunk_size=CHUNK_SIZE, on_ground=True):
+    # Spawn records (type, position, size, collide, interactable, contents)
+    # in a fixed order; a record's index is its id within the chunk. y is
+    # the height above the terrain, which on_ground adds.
+    rng = chunk_rng(seed, cx, cz)
+    x0, z0 = cx * chunk_size, cz * chunk_size
+    area_scale = chunk_size * chunk_size / BASE_AREA
+    spawns = []
+    
+    def scaled(count):
+        expected = count * area_scale
+        return int(expected) + (rng.random() < expected - int(expected))
+    
+    def spot(y):
+        return (x0 + rng.uniform(0, chunk_size), y, z0 + rng.uniform(0, chunk_size))
+    
+    for obj_type, count, size, collide, interactable, y in WORLD_SPAWNS:
+        for _ in range(scaled(count)):
+            contents = roll_loot(rng) if obj_type in CONTAINER_TYPES else None
+            spawns.append((obj_type, spot(y), size, collide, interactable, contents))
     
     # Add simple buildings with containers
-    for _ in range(5):
-        building_pos = [random.uniform(-50, 50), 0, random.uniform(-50, 50)]
-        building = GameObject(building_pos, None, 5.0, True, False, "building")
-        objects.append(building)
+    for _ in range(scaled(BUILDINGS_PER_BASE_AREA)):
+        building_pos = spot(0)
+        spawns.append(("building", building_pos, 5.0, True, False, None))
         
         # Add containers inside buildings
-        for _ in range(random.randint(1, 3)):
-            container_pos = [
-                building_pos[0] + random.uniform(-3, 3),
+        for _ in range(rng.randint(1, 3)):
+            container_pos = (
+                building_pos[0] + rng.uniform(-3, 3),
                 0.5,
-                building_pos[2] + random.uniform(-3, 3)
-            ]
-            objects.append(GameObject(container_pos, None, 0.8, False, True, "container"))
-    
+                building_pos[2] + rng.uniform(-3, 3)
+            )
+            spawns.append(("container", container_pos, 0.8, False, True, roll_loot(rng)))
+    
+    if on_ground and spawns:
+        ground = terrain_heights(seed, [record[1][0] for record in spawns], [record[1][2] for record in spawns])
+        spawns = [(obj_type, (x, y + height, z), size, collide, interactable, contents)
+                  for (obj_type, (x, y, z), size, collide, interactable, contents), height
+                  in zip(spawns, ground.tolist())]
+    return spawns
+
+def spawn_object(record, store):
+    obj_type, position, size, collide, interactable, contents = record
+    if obj_type == "animal":
+        return Animal(position, None, size, "deer", store=store)
+    obj = GameObject(position, None, size, collide, interactable, obj_type, store=store)
+    if contents is not None:
+        store.contents[obj.index] = dict(contents)
+    return obj
+
+def chunk_range(half):
+    return range(int(math.floor(-half / CHUNK_SIZE)), int(math.ceil(half / CHUNK_SIZE)))
+
+# Fixed-size worlds are generated a region (a run of chunks) at a time in a
+# process pool. Workers send back packed columns rather than pickled
+# objects, and regions are merged in order, so the world is identical
+# whatever the worker count.
+REGION_CHUNKS = 16
+WORLDGEN_WORKERS = None  # Processes for generate_world; None uses every core
+
+def pack_region(seed, keys, chunk_size=CHUNK_SIZE):
+    # Worker entry point: the chunks' spawn records as arrays
+    positions, sizes, tids, flags = [], [], [], []
+    contents_rows, contents_items, contents_amounts = [], [], []
+    for cx, cz in keys:
+        for obj_type, position, size, collide, interactable, contents in generate_chunk(seed, cx, cz, chunk_size, False):
+            if contents:
+                for item, amount in contents.items():
+                    contents_rows.append(len(sizes))
+                    contents_items.append(item)
+                    contents_amounts.append(amount)
+            positions.append(position)
+            sizes.append(size)
+            tids.append(type_id(obj_type))
+            flags.append((FLAG_COLLIDE if collide else 0) | (FLAG_INTERACTABLE if interactable else 0))
+    # Lift the whole region onto the terrain at once
+    positions = np.array(positions, dtype=np.float64).reshape(-1, 3)
+    if len(positions):
+        positions[:, 1] += terrain_heights(seed, positions[:, 0], positions[:, 2])
+    return {
+        "type_names": list(OBJECT_TYPES),
+        "positions": positions.astype(np.float32),
+        "sizes": np.array(sizes, dtype=np.float32),
+        "type_ids": np.array(tids, dtype=np.uint8),
+        "flags": np.array(flags, dtype=np.uint8),
+        "contents_rows": contents_rows,
+        "contents_items": contents_items,
+        "contents_amounts": contents_amounts,
+    }
+
+def _pack_region(args):
+    return pack_region(*args)
+
+def add_packed(store, pack, herd=None):
+    # Type ids are remapped by name in case the worker registered them differently
+    remap = np.array([type_id(name) for name in pack["type_names"]], dtype=np.uint8)
+    tids = remap[pack["type_ids"]]
+    start = store.extend(pack["positions"], pack["sizes"], tids, pack["flags"])
+    
+    container_ids = [TYPE_IDS[name] for name in CONTAINER_TYPES]
+    for index in (np.flatnonzero(np.isin(tids, container_ids)) + start).tolist():
+        store.contents[index] = {}
+    for row, item, amount in zip(pack["contents_rows"], pack["contents_items"], pack["contents_amounts"]):
+        store.contents[start + row][item] = amount
+    
+    Animal.adopt(store, (np.flatnonzero(tids == TYPE_IDS["animal"]) + start).tolist(), herd=herd)
+
+def generate_world(object_count=None, seed=None, store=None, workers=None):
+    # A fixed-size world: every chunk covering the area, loaded up front.
+    # object_count scales the area (keeping density) around the ~270 object
+    # default. Objects are added to store (a new WorldStore by default).
+    objects = store if store is not None else WorldStore()
+    scale = 1.0 if object_count is None else object_count / BASE_WORLD_OBJECTS
+    half = WORLD_HALF_SIZE * math.sqrt(scale)
+    keys = [(cx, cz) for cx in chunk_range(half) for cz in chunk_range(half)]
+    regions = [(seed, keys[i:i + REGION_CHUNKS]) for i in range(0, len(keys), REGION_CHUNKS)]
+    
+    if workers is None:
+        workers = WORLDGEN_WORKERS or os.cpu_count() or 1
+    workers = min(workers, len(regions))
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            for pack in pool.imap(_pack_region, regions):
+                add_packed(objects, pack)
+    else:
+        for region in regions:
+            add_packed(objects, _pack_region(region))
     return objects
 
-# Game objects
-game_objects = generate_world()
-        
-# Set up the display
-screen = pg.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), DOUBLEBUF | OPENGL)
-pg.display.set_caption("3D Survival Game")
-clock = pg.time.Clock()
+# Loads chunks as the player approaches and evicts far ones. Changes to a
+# chunk (removed objects, looted containers) are kept as a small delta keyed
+# by chunk id and applied when it is generated again. Animals are not
+# persisted - they respawn from their chunk.
+class WorldStreamer:
+    def __init__(self, store, seed, chunk_size=CHUNK_SIZE, load_radius=LOAD_RADIUS, unload_radius=UNLOAD_RADIUS):
+        self.store = store
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.load_radius = load_radius
+        self.unload_radius = max(unload_radius, load_radius)
+        self.loaded = {}  # {(cx, cz): [store index or None, per chunk id]}
+        self.origin = {}  # {store index: ((cx, cz), chunk id)}
+        self.deltas = {}  # {(cx, cz): {"removed": {chunk id}, "contents": {chunk id: dict}}}
+        self.modified = set()  # Store indices whose contents changed while loaded
+        self.center = None
+    
+    def chunk_of(self, pos):
+        return (int(math.floor(pos[0] / self.chunk_size)), int(math.floor(pos[2] / self.chunk_size)))
+    
+    def update(self, pos):
+        # Returns True if any chunk was loaded or unloaded
+        center = self.chunk_of(pos)
+        if center == self.center:
+            return False
+        self.center = center
+        cx, cz = center
+        for key in [key for key in self.loaded
+                    if max(abs(key[0] - cx), abs(key[1] - cz)) > self.unload_radius]:
+            self.unload(key)
+        for x in range(cx - self.load_radius, cx + self.load_radius + 1):
+            for z in range(cz - self.load_radius, cz + self.load_radius + 1):
+                if (x, z) not in self.loaded:
+                    self.load((x, z))
+        return True
+    
+    def load(self, key):
+        delta = self.deltas.get(key)
+        removed = delta["removed"] if delta else ()
+        indices = []
+        for chunk_id, record in enumerate(generate_chunk(self.seed, key[0], key[1], self.chunk_size)):
+            if chunk_id in removed:
+                indices.append(None)
+                continue
+            obj = spawn_object(record, self.store)
+            if delta and chunk_id in delta["contents"]:
+                self.store.contents[obj.index] = dict(delta["contents"][chunk_id])
+            index_object(obj)
+            self.origin[obj.index] = (key, chunk_id)
+            indices.append(obj.index)
+        self.loaded[key] = indices
+    
+    def unload(self, key):
+        for chunk_id, index in enumerate(self.loaded.pop(key)):
+            if index is None:
+                continue
+            del self.origin[index]
+            if index in self.modified:
+                self.modified.discard(index)
+                self._delta(key)["contents"][chunk_id] = dict(self.store.contents.get(index, {}))
+            despawn_object(self.store.handle(index))
+    
+    def _delta(self, key):
+        delta = self.deltas.get(key)
+        if delta is None:
+            delta = self.deltas[key] = {"removed": set(), "contents": {}}
+        return delta
+    
+    def record_contents(self, obj):
+        # Call after changing a container's contents
+        if obj.index in self.origin:
+            self.modified.add(obj.index)
+    
+    def record_removed(self, obj):
+        # Call before despawning an object for good (harvested, killed...).
+        # Returns its (chunk, chunk id), or None if it came from no chunk.
+        origin = self.origin.pop(obj.index, None)
+        if origin is None:
+            return None
+        key, chunk_id = origin
+        self.modified.discard(obj.index)
+        self._delta(key)["removed"].add(chunk_id)
+        self._delta(key)["contents"].pop(chunk_id, None)
+        self.loaded[key][chunk_id] = None
+        return origin
+    
+    def record_restored(self, origin, index):
+        # A removed object is back. If its chunk is loaded, the object at
+        # index takes its slot again and True is returned; otherwise the
+        # chunk regenerates it on its next load.
+        key, chunk_id = origin
+        delta = self.deltas.get(key)
+        if delta is not None:
+            delta["removed"].discard(chunk_id)
+            if not delta["removed"] and not delta["contents"]:
+                del self.deltas[key]
+        if key not in self.loaded:
+            return False
+        self.loaded[key][chunk_id] = index
+        self.origin[index] = origin
+        return True
 
-# Set up OpenGL
-glViewport(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
-glMatrixMode(GL_PROJECTION)
-glLoadIdentity()
-gluPerspective(FOV, SCREEN_WIDTH / SCREEN_HEIGHT, NEAR_CLIP, FAR_CLIP)
-glMatrixMode(GL_MODELVIEW)
-glEnable(GL_DEPTH_TEST)
+# Game objects (a WorldStore), filled in by init_world
+game_objects = WorldStore()
+collision_grid = SpatialGrid()
+interaction_grid = SpatialGrid()
+interaction_bvh = SphereBVH(interaction_grid, animal_herd)
+interaction_prompt = InteractionPromptCache(interaction_bvh)
 
-# Hide mouse and center it
-pg.mouse.set_visible(False)
-pg.event.set_grab(True)
+def look_target(pos, rot):
+    # Interactable under the crosshair within reach, if any
+    return interaction_bvh.pick(pos, view_direction(rot), INTERACT_REACH)
 
-# UI rendering functions
-def render_text(text, position, size=30, color=(255, 255, 255)):
-    font = pg.font.Font(None, size)
-    text_surface = font.render(text, True, color)
-    screen.blit(text_surface, position)
+world_streamer = None  # Set when the world is streamed rather than fixed-size
+WORLD_SEED = 0
+game_rng = random.Random(WORLD_SEED)  # Gameplay rolls (harvest yields), reseeded by init_world
+terrain = terrain_for(WORLD_SEED)  # Replaced by init_world and load_game
 
-def draw_ui():
-    # Switch to 2D mode for UI
+def height_at(x, z):
+    # Ground height under a point of the current world
+    return terrain.height_at(x, z)
+
+def index_object(obj):
+    # Add a freshly spawned object to every index over the world
+    if obj.collide:
+        collision_grid.insert(obj)
+    if obj.interactable:
+        interaction_bvh.insert(obj)
+        interaction_grid.insert(obj)
+    if scene_renderer is not None:
+        scene_renderer.add(obj)
+
+def despawn_object(obj):
+    # Drop an object from every index, then free its store row
+    collision_grid.remove(obj)
+    interaction_bvh.remove(obj)
+    interaction_grid.remove(obj)
+    if scene_renderer is not None:
+        scene_renderer.remove(obj)
+    if isinstance(obj, Animal):
+        obj.herd.remove(obj.herd_index)
+    obj.store.remove(obj.index)
+
+# Harvested resources leave the world and come back where they stood after a
+# cooldown (seconds of sim time). Their store rows are released rather than
+# freed, so a respawn revives the same row, handle and BVH slot. The herd's
+# obstacle set is left alone meanwhile - a tree is only ever gone for a while.
+RESPAWN_TIMES = {
+    "tree": 300.0,
+    "rock": 600.0,
+    "grass": 60.0,
+    "metal": 600.0,
+    "nails": 600.0,
+    "animal": 180.0,
+}
+
+def harvest_object(obj):
+    # Take a harvested object out of the world and schedule its respawn
+    store = obj.store
+    if not store.is_alive(obj.index):
+        return
+    origin = world_streamer.record_removed(obj) if world_streamer is not None else None
+    animal_type = None
+    interaction_bvh.remove(obj, keep_slot=True)
+    collision_grid.remove(obj)
+    interaction_grid.remove(obj)
+    if scene_renderer is not None:
+        scene_renderer.remove(obj)
+    if isinstance(obj, Animal):
+        animal_type = obj.animal_type
+        obj.herd.remove(obj.herd_index)
+    store.release(obj.index)
+    sim_timers.schedule(("respawn", obj.index), RESPAWN_TIMES[obj.type], respawn_object,
+                        payload=(obj.index, origin, animal_type))
+
+def respawn_object(job):
+    index, origin, animal_type = job.payload
+    store = game_objects
+    if origin is not None and not world_streamer.record_restored(origin, index):
+        store.remove(index)  # Its chunk was unloaded and will regenerate it
+        return
+    if not store.revive(index):
+        return
+    if animal_type is not None:
+        obj = Animal.adopt(store, [index], animal_type)[0]  # Back at its spawn point
+    else:
+        obj = store.handle(index)
+    index_object(obj)
+
+def refresh_herd_obstacles():
+    n = game_objects.count
+    static_colliders = (game_objects.flags[:n] & (FLAG_COLLIDE | FLAG_ALIVE) == FLAG_COLLIDE | FLAG_ALIVE) \
+        & (game_objects.type_ids[:n] != TYPE_IDS["animal"])
+    animal_herd.set_obstacles(game_objects.positions[:n][static_colliders], game_objects.sizes[:n][static_colliders])
+
+def init_world(object_count=None, seed=None):
+    # Build the world and every index over it. Needs no window or GL context.
+    # Without an object count the world is infinite and streamed in chunks
+    # around the player; with one it is a fixed area generated up front.
+    global game_objects, collision_grid, interaction_grid, interaction_bvh, interaction_prompt, animal_herd, sim_time, sim_timers, world_streamer
+    global game_rng, terrain
+    # Everything random derives from the seed, so a seed and the player's
+    # input reproduce a session exactly
+    if seed is None:
+        seed = WORLD_SEED
+    game_rng = random.Random(seed)
+    terrain = terrain_for(seed)
+    sim_time = 0.0
+    sim_timers = TimerScheduler()
+    animal_herd = AnimalHerd(seed=seed)
+    animal_herd.ground = terrain
+    if object_count is None:
+        game_objects = WorldStore()
+        collision_grid = SpatialGrid()
+        interaction_grid = SpatialGrid()
+        world_streamer = WorldStreamer(game_objects, seed)
+        world_streamer.update(player_pos)
+    else:
+        world_streamer = None
+        game_objects = generate_world(object_count, seed)
+        collision_grid, interaction_grid = build_grids(game_objects)
+    interaction_bvh = SphereBVH(interaction_grid, animal_herd)
+    interaction_prompt = InteractionPromptCache(interaction_bvh)
+    refresh_herd_obstacles()
+
+# Display, GL state and the renderer only exist once init_display has run
+screen = None
+clock = None
+scene_renderer = None
+terrain_renderer = None
+
+def init_display():
+    global screen, clock, scene_renderer, terrain_renderer
+    pg.init()
+    
+    # Set up the display
+    screen = pg.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), DOUBLEBUF | OPENGL)
+    pg.display.set_caption("3D Survival Game")
+    clock = pg.time.Clock()
+    
+    # Set up OpenGL
+    glViewport(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
     glMatrixMode(GL_PROJECTION)
-    glPushMatrix()
     glLoadIdentity()
-    glOrtho(0, SCREEN_WIDTH, SCREEN_HEIGHT, 0, -1, 1)
+    gluPerspective(FOV, SCREEN_WIDTH / SCREEN_HEIGHT, NEAR_CLIP, FAR_CLIP)
     glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    glLoadIdentity()
-    glDisable(GL_DEPTH_TEST)
+    glEnable(GL_DEPTH_TEST)
     
-    # Draw 2D elements with Pygame on top of the 3D scene
-    # We need to temporarily stop using OpenGL to draw with Pygame
-    pg.display.flip()
+    # Upload every object into the instanced renderer once
+    scene_renderer = InstancedRenderer()
+    terrain_renderer = TerrainRenderer()
+    for obj in game_objects:
+        scene_renderer.add(obj)
     
-    # Draw crosshair
-    pg.draw.line(screen, (255, 255, 255), (SCREEN_WIDTH//2-10, SCREEN_HEIGHT//2), (SCREEN_WIDTH//2+10, SCREEN_HEIGHT//2), 2)
-    pg.draw.line(screen, (255, 255, 255), (SCREEN_WIDTH//2, SCREEN_HEIGHT//2-10), (SCREEN_WIDTH//2, SCREEN_HEIGHT//2+10), 2)
+    # Hide mouse and center it
+    pg.mouse.set_visible(False)
+    pg.event.set_grab(True)
+
+# Frame profiler: named scopes accumulate seconds into the current row of a
+# fixed ring buffer (one row per frame, one column per scope), so recording
+# allocates nothing once a scope is registered. Scopes may nest - a parent's
+# time includes its children - but a scope must not re-enter itself.
+PROFILE_FRAMES = 600  # Frames kept in the ring buffer
+PROFILE_MAX_SCOPES = 32
+
+class ProfileScope:
+    __slots__ = ("profiler", "column", "start")
+    
+    def __init__(self, profiler, column):
+        self.profiler = profiler
+        self.column = column
+        self.start = 0.0
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        profiler = self.profiler
+        profiler.samples[profiler.row, self.column] += time.perf_counter() - self.start
+        return False
+
+class FrameProfiler:
+    def __init__(self, capacity=PROFILE_FRAMES, max_scopes=PROFILE_MAX_SCOPES):
+        self.capacity = capacity
+        self.samples = np.zeros((capacity, max_scopes))  # Seconds
+        self.names = []
+        self.scopes = {}  # {name: ProfileScope}, reused every frame
+        self.frames = 0  # Completed frames
+        self.row = 0
+        self.frame_start = 0.0
+        self.scope("frame")  # Column 0 is the whole frame
+    
+    def scope(self, name):
+        scope = self.scopes.get(name)
+        if scope is None:
+            if len(self.names) == self.samples.shape[1]:
+                raise ValueError(f"Profiler is limited to {self.samples.shape[1]} scopes")
+            scope = self.scopes[name] = ProfileScope(self, len(self.names))
+            self.names.append(name)
+        return scope
+    
+    def begin_frame(self):
+        self.row = self.frames % self.capacity
+        self.samples[self.row] = 0.0
+        self.frame_start = time.perf_counter()
+    
+    def end_frame(self):
+        self.samples[self.row, 0] = time.perf_counter() - self.frame_start
+        self.frames += 1
+    
+    def history(self):
+        # Recorded rows, oldest first, in milliseconds
+        n = min(self.frames, self.capacity)
+        order = (np.arange(n) + (self.frames - n)) % self.capacity
+        return self.samples[order, :len(self.names)] * 1000.0
+    
+    def percentiles(self):
+        # {name: (p50, p95, p99)} in milliseconds
+        history = self.history()
+        if not len(history):
+            return {}
+        p50, p95, p99 = np.percentile(history, [50, 95, 99], axis=0)
+        return {name: (float(p50[i]), float(p95[i]), float(p99[i])) for i, name in enumerate(self.names)}
+    
+    def dump_csv(self, path):
+        history = self.history()
+        first = self.frames - len(history)
+        frames = np.arange(first, first + len(history))[:, None]
+        np.savetxt(path, np.hstack([frames, history]), delimiter=",", comments="",
+                   header=",".join(["index"] + self.names), fmt=["%d"] + ["%.4f"] * len(self.names))
+    
+    def dump_json(self, path, counters=None):
+        # counters: extra per-frame figures (JSON-able) written alongside the timings
+        history = self.history()
+        report = {
+            "frames": self.frames,
+            "recorded": len(history),
+            "phases_ms": {name: {"p50": p50, "p95": p95, "p99": p99, "mean": float(history[:, i].mean())}
+                          for i, (name, (p50, p95, p99)) in enumerate(self.percentiles().items())},
+            "samples_ms": {name: history[:, i].tolist() for i, name in enumerate(self.names)},
+        }
+        if counters:
+            report["counters"] = counters
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1)
+
+profiler = FrameProfiler()
+show_profiler = False
+PROFILE_DUMP_PATH = "profile"  # F4 writes profile.csv and profile.json
+
+# Snapshots: the world store and herd are written column by column into an
+# uncompressed .npz, so loading is a handful of array copies plus rebuilding
+# the grids. Small scalar state (player, streamer deltas, rng) rides along
+# as one JSON string. Bump SAVE_VERSION whenever the layout changes.
+SAVE_MAGIC = "claudesurv-save"
+SAVE_VERSION = 4
+SAVE_PATH = "savegame.npz"
+HERD_COLUMNS = ("positions", "prev_positions", "directions", "speeds", "sizes", "next_turn")
+
+def save_game(path=SAVE_PATH):
+    store = game_objects
+    herd = animal_herd
+    n = store.count
+    
+    # Animal positions live in the herd; store them in their rows so the
+    # grids are rebuilt in the right cells
+    positions = store.positions[:n].copy()
+    herd_rows = np.array([animal.index for animal in herd.animals], dtype=np.int64)
+    positions[herd_rows] = herd.positions[:herd.count]
+    
+    container_rows = np.array(sorted(store.contents), dtype=np.int64)
+    contents_rows, contents_items, contents_amounts = [], [], []
+    for index in container_rows.tolist():
+        for item, amount in store.contents[index].items():
+            contents_rows.append(index)
+            contents_items.append(item)
+            contents_amounts.append(amount)
+    
+    cooking = [(job.owner.index, job.payload, job.duration, sim_timers.remaining(job), job.paused)
+               for job in sim_timers.jobs.values() if job.callback is finish_cooking]
+    respawns = [(job.payload[0], sim_timers.remaining(job), job.payload[1], job.payload[2])
+                for job in sim_timers.jobs.values() if job.callback is respawn_object]
+    
+    state = {
+        "player_pos": list(player_pos),
+        "player_rot": list(player_rot),
+        "player_inventory": dict(player_inventory.items()),
+        "player_quick_bar": player_quick_bar,
+        "selected_slot": selected_slot,
+        "player_health": player_health,
+        "player_hunger": player_hunger,
+        "player_thirst": player_thirst,
+        "player_stamina": player_stamina,
+        "sim_time": sim_time,
+        "timer_now": sim_timers.now,
+        "cooking": cooking,
+        "free": [int(index) for index in store.free],
+        "released": [[index, flags] for rows in store.released.values() for index, flags in rows.items()],
+        "respawns": respawns,
+        "herd_time": herd.time,
+        "herd_rng": herd.rng.bit_generator.state,
+        "game_rng": game_rng.getstate(),
+        "terrain_seed": terrain.seed,
+        "animal_types": [animal.animal_type for animal in herd.animals],
+        "streamer": None,
+    }
+    if world_streamer is not None:
+        streamer = world_streamer
+        state["streamer"] = {
+            "seed": streamer.seed,
+            "chunk_size": streamer.chunk_size,
+            "load_radius": streamer.load_radius,
+            "unload_radius": streamer.unload_radius,
+            "center": streamer.center,
+            "loaded": [[key[0], key[1], indices] for key, indices in streamer.loaded.items()],
+            "deltas": [[key[0], key[1], sorted(delta["removed"]), list(delta["contents"].items())]
+                       for key, delta in streamer.deltas.items()],
+            "modified": sorted(streamer.modified),
+        }
     
-    # Draw quick bar
-    quick_bar_width = 400
-    quick_bar_height = 50
-    quick_bar_x = (SCREEN_WIDTH - quick_bar_width) // 2
-    quick_bar_y = SCREEN_HEIGHT - quick_bar_height - 10
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            magic=np.array(SAVE_MAGIC),
+            version=np.array(SAVE_VERSION),
+            state=np.array(json.dumps(state)),
+            type_names=np.array([name or "" for name in OBJECT_TYPES]),
+            positions=positions,
+            sizes=store.sizes[:n],
+            type_ids=store.type_ids[:n],
+            flags=store.flags[:n],
+            container_rows=container_rows,
+            contents_rows=np.array(contents_rows, dtype=np.int64),
+            contents_items=np.array(contents_items, dtype=str),
+            contents_amounts=np.array(contents_amounts, dtype=np.int64),
+            herd_rows=herd_rows,
+            **{"herd_" + name: getattr(herd, name)[:herd.count] for name in HERD_COLUMNS},
+        )
+
+def load_game(path=SAVE_PATH):
+    global game_objects, collision_grid, interaction_grid, interaction_bvh, interaction_prompt, animal_herd, sim_time, sim_timers, world_streamer
+    global player_pos, player_prev_pos, player_rot, player_inventory, player_quick_bar, selected_slot
+    global player_health, player_hunger, player_thirst, player_stamina, player_near_campfire, nearby_campfire
+    global game_rng, terrain
+    
+    with np.load(path, allow_pickle=False) as data:
+        if "magic" not in data or str(data["magic"]) != SAVE_MAGIC:
+            raise ValueError(f"{path} is not a save file")
+        version = int(data["version"])
+        if version != SAVE_VERSION:
+            raise ValueError(f"{path} has save version {version}, expected {SAVE_VERSION}")
+        columns = {name: data[name] for name in data.files}
+    state = json.loads(str(columns["state"]))
+    
+    # Type ids are remapped by name in case types were registered in another order
+    remap = np.array([type_id(name or None) for name in columns["type_names"].tolist()], dtype=np.uint8)
+    
+    n = len(columns["sizes"])
+    store = WorldStore(max(n, 1024))
+    store.count = n
+    store.positions[:n] = columns["positions"]
+    store.sizes[:n] = columns["sizes"]
+    store.type_ids[:n] = remap[columns["type_ids"]]
+    store.flags[:n] = columns["flags"]
+    store.free = state["free"]
+    for index, flags in state["released"]:
+        store.released.setdefault(int(store.type_ids[index]), {})[index] = flags
+    store.live = n - len(store.free) - len(state["released"])
+    store.reindex()
+    for index in columns["container_rows"].tolist():
+        store.contents[index] = {}
+    for index, item, amount in zip(columns["contents_rows"].tolist(), columns["contents_items"].tolist(),
+                                   columns["contents_amounts"].tolist()):
+        store.contents[index][item] = amount
+    
+    herd_rows = columns["herd_rows"].tolist()
+    herd = AnimalHerd(capacity=max(len(herd_rows), 64))
+    herd.count = len(herd_rows)
+    for name in HERD_COLUMNS:
+        getattr(herd, name)[:herd.count] = columns["herd_" + name]
+    herd.time = state["herd_time"]
+    herd.last_step[:herd.count] = herd.time
+    herd.rng.bit_generator.state = state["herd_rng"]
+    terrain = terrain_for(state["terrain_seed"])
+    herd.ground = terrain
+    version, internal, gauss = state["game_rng"]  # JSON turned the tuples into lists
+    game_rng = random.Random()
+    game_rng.setstate((version, tuple(internal), gauss))
+    for herd_index, (index, animal_type) in enumerate(zip(herd_rows, state["animal_types"])):
+        animal = Animal.view(store, index)
+        animal.herd = herd
+        animal.herd_index = herd_index
+        animal.animal_type = animal_type
+        herd.animals.append(animal)
+        store.animals[index] = animal
+    
+    # Swap the new world in and rebuild everything derived from it
+    if scene_renderer is not None:
+        for obj in list(scene_renderer.object_cells):
+            scene_renderer.remove(obj)
+    game_objects = store
+    animal_herd = herd
+    collision_grid, interaction_grid = build_grids(store)
+    interaction_bvh = SphereBVH(interaction_grid, animal_herd)
+    interaction_prompt = InteractionPromptCache(interaction_bvh)
+    refresh_herd_obstacles()
+    if scene_renderer is not None:
+        for obj in store:
+            scene_renderer.add(obj)
+    
+    world_streamer = None
+    streamer_state = state["streamer"]
+    if streamer_state is not None:
+        streamer = WorldStreamer(store, streamer_state["seed"], streamer_state["chunk_size"],
+                                 streamer_state["load_radius"], streamer_state["unload_radius"])
+        streamer.center = tuple(streamer_state["center"]) if streamer_state["center"] else None
+        for cx, cz, indices in streamer_state["loaded"]:
+            streamer.loaded[(cx, cz)] = indices
+            for chunk_id, index in enumerate(indices):
+                if index is not None:
+                    streamer.origin[index] = ((cx, cz), chunk_id)
+        for cx, cz, removed, contents in streamer_state["deltas"]:
+            streamer.deltas[(cx, cz)] = {"removed": set(removed),
+                                         "contents": {chunk_id: items for chunk_id, items in contents}}
+        streamer.modified = set(streamer_state["modified"])
+        world_streamer = streamer
+    
+    sim_time = state["sim_time"]
+    sim_timers = TimerScheduler()
+    sim_timers.now = state["timer_now"]
+    for index, item, duration, remaining, paused in state["cooking"]:
+        job = start_cooking(store.handle(index), item, remaining)
+        job.duration = duration
+        if paused:
+            sim_timers.pause_job(job.key)
+    for index, remaining, origin, animal_type in state["respawns"]:
+        if origin is not None:
+            origin = (tuple(origin[0]), origin[1])
+        sim_timers.schedule(("respawn", index), remaining, respawn_object, payload=(index, origin, animal_type))
+    
+    player_pos = state["player_pos"]
+    player_prev_pos = list(player_pos)
+    player_rot = state["player_rot"]
+    player_inventory = Inventory(state["player_inventory"])
+    player_quick_bar = state["player_quick_bar"]
+    selected_slot = state["selected_slot"]
+    player_health = state["player_health"]
+    player_hunger = state["player_hunger"]
+    player_thirst = state["player_thirst"]
+    player_stamina = state["player_stamina"]
+    player_near_campfire = False
+    nearby_campfire = None
+
+# Fonts are cached per size and rendered strings in an LRU keyed by
+# (text, size, colour), bounded by both entry count and surface bytes
+class TextCache:
+    def __init__(self, max_entries=512, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.fonts = {}  # {size: pg.font.Font}
+        self.surfaces = OrderedDict()  # {(text, size, color): surface}, oldest first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pg.font.Font(None, size)
+        return font
+    
+    def render(self, text, size, color):
+        key = (text, size, tuple(color))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        
+        self.misses += 1
+        surface = self.font(size).render(text, True, color)
+        self.surfaces[key] = surface
+        self.bytes += surface.get_width() * surface.get_height() * surface.get_bytesize()
+        
+        while len(self.surfaces) > self.max_entries or (self.bytes > self.max_bytes and len(self.surfaces) > 1):
+            _, old = self.surfaces.popitem(last=False)
+            self.bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+            self.evictions += 1
+        return surface
+    
+    def stats(self):
+        return {
+            "entries": len(self.surfaces),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+text_cache = TextCache()
+
+# UI rendering functions
+def render_text(text, position, size=30, color=(255, 255, 255), surface=None):
+    (surface or screen).blit(text_cache.render(text, size, color), position)
+
+# Retained HUD: every widget owns a pre-rendered surface and a state
+# function returning exactly what it displays. A widget is repainted only
+# when that state changes (None hides it), so a steady HUD costs one cheap
+# comparison per widget per frame. Widgets paint in their own coordinates.
+class HudWidget:
+    UNSET = object()
+    
+    def __init__(self, rect, state, paint):
+        self.rect = pg.Rect(rect)
+        self.state = state
+        self.paint = paint
+        self.value = self.UNSET
+        self.surface = None
+    
+    def update(self):
+        # Returns True if the widget was repainted or hidden
+        value = self.state()
+        if value == self.value:
+            return False
+        self.value = value
+        if value is None:
+            self.surface = None
+        else:
+            if self.surface is None:
+                self.surface = pg.Surface(self.rect.size, pg.SRCALPHA)
+            else:
+                self.surface.fill((0, 0, 0, 0))
+            self.paint(self.surface, value)
+        return True
+
+# Widgets are composited into one screen-sized overlay surface. Only the
+# rects of widgets that changed are recomposed, and those rects are what
+# gets re-uploaded to the overlay texture.
+class HudLayer:
+    def __init__(self, size, widgets=()):
+        self.surface = pg.Surface(size, pg.SRCALPHA)
+        self.bounds = self.surface.get_rect()
+        self.widgets = list(widgets)
+        self.repaints = 0
+    
+    def update(self):
+        # Returns the overlay rects that changed this frame
+        changed = [widget for widget in self.widgets if widget.update()]
+        self.repaints += len(changed)
+        dirty = [widget.rect.clip(self.bounds) for widget in changed]
+        dirty = [rect for rect in dirty if rect.width and rect.height]
+        for rect in dirty:
+            self.compose(rect)
+        return dirty
+    
+    def compose(self, rect):
+        surface = self.surface
+        surface.set_clip(rect)
+        surface.fill((0, 0, 0, 0), rect)
+        for widget in self.widgets:
+            if widget.surface is not None and widget.rect.colliderect(rect):
+                surface.blit(widget.surface, widget.rect)
+        surface.set_clip(None)
+
+# The overlay as a GL texture, patched with glTexSubImage2D over dirty rects
+# and drawn as one screen-sized quad in the ortho pass
+class HudTexture:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.uploaded_bytes = 0
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE,
+                     bytes(width * height * 4))
+        glBindTexture(GL_TEXTURE_2D, 0)
+    
+    def upload(self, surface, rects):
+        if not rects:
+            return
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        for rect in rects:
+            data = pg.image.tostring(surface.subsurface(rect), "RGBA")
+            glTexSubImage2D(GL_TEXTURE_2D, 0, rect.x, rect.y, rect.width, rect.height,
+                            GL_RGBA, GL_UNSIGNED_BYTE, data)
+            self.uploaded_bytes += len(data)
+        glBindTexture(GL_TEXTURE_2D, 0)
+    
+    def draw(self):
+        # Texture rows run top-down like the surface, matching the y-down ortho
+        glEnable(GL_TEXTURE_2D)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glColor4f(1, 1, 1, 1)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 0)
+        glVertex2f(0, 0)
+        glTexCoord2f(0, 1)
+        glVertex2f(0, self.height)
+        glTexCoord2f(1, 1)
+        glVertex2f(self.width, self.height)
+        glTexCoord2f(1, 0)
+        glVertex2f(self.width, 0)
+        glEnd()
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_BLEND)
+        glDisable(GL_TEXTURE_2D)
+
+QUICK_BAR_RECT = ((SCREEN_WIDTH - 400) // 2, SCREEN_HEIGHT - 50 - 10, 400, 50)
+STAT_BAR_WIDTH = 150
+STAT_BAR_HEIGHT = 15
+# (label, value, background colour, fill colour)
+STAT_BARS = [
+    ("Health", lambda: player_health, (100, 0, 0), (255, 0, 0)),
+    ("Hunger", lambda: player_hunger, (100, 50, 0), (255, 150, 0)),
+    ("Thirst", lambda: player_thirst, (0, 0, 100), (0, 0, 255)),
+    ("Stamina", lambda: player_stamina, (0, 100, 0), (0, 255, 0)),
+]
+INVENTORY_RECT = ((SCREEN_WIDTH - 600) // 2, (SCREEN_HEIGHT - 400) // 2, 600, 400)
+CRAFTING_MENU_RECT = ((SCREEN_WIDTH - 500) // 2, (SCREEN_HEIGHT - 500) // 2, 500, 500)
+COOKING_PANEL_RECT = (SCREEN_WIDTH - 200, 200, 200, 300)
+PROFILER_RECT = (SCREEN_WIDTH - 330, 10, 320, 290)
+PROFILER_GRAPH_HEIGHT = 60
+PROFILER_GRAPH_MS = 33.3  # Frame time at the top of the graph
+# Phases stacked in the graph; nested scopes are left out so nothing counts twice
+PROFILER_GRAPH_PHASES = [
+    ("handle_input", (80, 160, 255)),
+    ("update_game_state", (255, 180, 60)),
+    ("render_scene", (120, 220, 120)),
+    ("flip", (200, 120, 220)),
+]
+
+def paint_crosshair(surface, value):
+    pg.draw.line(surface, (255, 255, 255), (0, 10), (20, 10), 2)
+    pg.draw.line(surface, (255, 255, 255), (10, 0), (10, 20), 2)
+
+def paint_quick_bar(surface, value):
+    items, selected = value
+    quick_bar_width, quick_bar_height = surface.get_size()
+    slot_width = quick_bar_width // len(items)
     
     # Draw slots
-    for i in range(len(player_quick_bar)):
-        slot_width = quick_bar_width // len(player_quick_bar)
-        slot_x = quick_bar_x + i * slot_width
+    for i, item in enumerate(items):
+        slot_x = i * slot_width
         
         # Draw selected slot with highlight
-        if i == selected_slot:
-            pg.draw.rect(screen, (200, 200, 100), (slot_x, quick_bar_y, slot_width, quick_bar_height), 2)
+        if i == selected:
+            pg.draw.rect(surface, (200, 200, 100), (slot_x, 0, slot_width, quick_bar_height), 2)
         else:
-            pg.draw.rect(screen, (150, 150, 150), (slot_x, quick_bar_y, slot_width, quick_bar_height), 1)
+            pg.draw.rect(surface, (150, 150, 150), (slot_x, 0, slot_width, quick_bar_height), 1)
         
         # Draw item name
-        if player_quick_bar[i]:
-            render_text(player_quick_bar[i], (slot_x + 5, quick_bar_y + 15))
-    
-    # Draw health, hunger, thirst, stamina bars
-    bar_width = 150
-    bar_height = 15
-    bar_x = 20
-    bar_y = 20
-    
-    # Health bar (red)
-    pg.draw.rect(screen, (100, 0, 0), (bar_x, bar_y, bar_width, bar_height))
-    pg.draw.rect(screen, (255, 0, 0), (bar_x, bar_y, bar_width * player_health / 100, bar_height))
-    render_text("Health", (bar_x + 5, bar_y))
-    
-    # Hunger bar (orange)
-    bar_y += bar_height + 5
-    pg.draw.rect(screen, (100, 50, 0), (bar_x, bar_y, bar_width, bar_height))
-    pg.draw.rect(screen, (255, 150, 0), (bar_x, bar_y, bar_width * player_hunger / 100, bar_height))
-    render_text("Hunger", (bar_x + 5, bar_y))
-    
-    # Thirst bar (blue)
-    bar_y += bar_height + 5
-    pg.draw.rect(screen, (0, 0, 100), (bar_x, bar_y, bar_width, bar_height))
-    pg.draw.rect(screen, (0, 0, 255), (bar_x, bar_y, bar_width * player_thirst / 100, bar_height))
-    render_text("Thirst", (bar_x + 5, bar_y))
-    
-    # Stamina bar (green)
-    bar_y += bar_height + 5
-    pg.draw.rect(screen, (0, 100, 0), (bar_x, bar_y, bar_width, bar_height))
-    pg.draw.rect(screen, (0, 255, 0), (bar_x, bar_y, bar_width * player_stamina / 100, bar_height))
-    render_text("Stamina", (bar_x + 5, bar_y))
-    
-    # Show interaction prompt if player is near an interactable object
-    for obj in game_objects:
-        if obj.interactable:
-            distance = np.linalg.norm(np.array(player_pos) - obj.position)
-            if distance < obj.size + 2:  # Within interaction range
-                prompt = f"Press E to interact with {obj.type}"
-                render_text(prompt, (SCREEN_WIDTH//2 - 100, SCREEN_HEIGHT//2 + 50))
-                break
+        if item:
+            render_text(item, (slot_x + 5, 15), surface=surface)
+
+def stat_bar_widget(row, label, value, background, fill):
+    def state():
+        return int(value())  # Whole percent; the bar is only 150px wide
     
-    # Draw inventory if open
-    if show_inventory:
-        draw_inventory()
-    
-    # Draw crafting menu if open
-    if crafting_menu_open:
-        draw_crafting_menu()
-    
-    # Draw cooking status if items are cooking
-    if cooking_items and player_near_campfire:
-        cooking_y = 200
-        render_text("Cooking:", (SCREEN_WIDTH - 200, cooking_y))
-        cooking_y += 30
-        
-        for item, end_time in list(cooking_items.items()):
-            remaining = end_time - time.time()
-            if remaining <= 0:
-                # Cooking finished
-                if item == "meat":
-                    player_inventory["cooked_meat"] = player_inventory.get("cooked_meat", 0) + 1
-                elif item == "water":
-                    player_inventory["purified_water"] = player_inventory.get("purified_water", 0) + 1
-                
-                cooking_items.pop(item)
-            else:
-                progress = (30 - remaining) / 30 * 100  # 30 seconds cooking time
-                pg.draw.rect(screen, (50, 50, 50), (SCREEN_WIDTH - 200, cooking_y, 150, 20))
-                pg.draw.rect(screen, (200, 100, 0), (SCREEN_WIDTH - 200, cooking_y, 150 * progress / 100, 20))
-                render_text(f"{item}: {int(remaining)}s", (SCREEN_WIDTH - 190, cooking_y))
-                cooking_y += 25
+    def paint(surface, percent):
+        pg.draw.rect(surface, background, (0, 0, STAT_BAR_WIDTH, STAT_BAR_HEIGHT))
+        pg.draw.rect(surface, fill, (0, 0, STAT_BAR_WIDTH * percent / 100, STAT_BAR_HEIGHT))
+        render_text(label, (5, 0), surface=surface)
     
-    # Switch back to 3D mode
-    glEnable(GL_DEPTH_TEST)
-    glMatrixMode(GL_PROJECTION)
-    glPopMatrix()
-    glMatrixMode(GL_MODELVIEW)
-    glPopMatrix()
+    # Tall enough for the label, which overhangs the bar
+    return HudWidget((20, 20 + row * (STAT_BAR_HEIGHT + 5), STAT_BAR_WIDTH, 22), state, paint)
+
+def prompt_state():
+    # Show interaction prompt if the player is looking at an interactable in reach
+    target = interaction_prompt.target_at(player_pos, player_rot)
+    return target.type if target is not None else None
+
+def paint_prompt(surface, target_type):
+    render_text(f"Press E to interact with {target_type}", (0, 0), surface=surface)
+
+def cooking_state():
+    # Cooking status for the campfire we're standing at. Completion is
+    # handled by sim_timers, this only displays progress.
+    cooking_jobs = sim_timers.jobs_for(nearby_campfire) if player_near_campfire else []
+    if not cooking_jobs:
+        return None
+    rows = []
+    for job in cooking_jobs:
+        remaining = sim_timers.remaining(job)
+        progress = int((job.duration - remaining) / job.duration * 100)
+        rows.append((job.payload, int(remaining), progress))
+    return tuple(rows)
+
+def paint_cooking(surface, rows):
+    render_text("Cooking:", (0, 0), surface=surface)
+    cooking_y = 30
+    for payload, remaining, progress in rows:
+        pg.draw.rect(surface, (50, 50, 50), (0, cooking_y, 150, 20))
+        pg.draw.rect(surface, (200, 100, 0), (0, cooking_y, 150 * progress / 100, 20))
+        render_text(f"{payload}: {remaining}s", (10, cooking_y), surface=surface)
+        cooking_y += 25
+
+def profiler_state():
+    # Repainted every few frames while shown
+    return profiler.frames // 4 if show_profiler else None
 
-def draw_inventory():
+def paint_profiler(surface, value):
+    width, height = surface.get_size()
+    surface.fill((0, 0, 0, 170))
+    
+    # Stacked frame-time columns, newest on the right
+    history = profiler.history()[-width:]
+    phases = [(profiler.names.index(name), color) for name, color in PROFILER_GRAPH_PHASES if name in profiler.scopes]
+    if len(history) and phases:
+        scale = PROFILER_GRAPH_HEIGHT / PROFILER_GRAPH_MS
+        tops = np.minimum(np.cumsum(history[:, [column for column, _ in phases]], axis=1) * scale, PROFILER_GRAPH_HEIGHT)
+        tops = (PROFILER_GRAPH_HEIGHT - tops).astype(int).tolist()
+        x = width - len(history)
+        for column_tops in tops:
+            bottom = PROFILER_GRAPH_HEIGHT
+            for top, (_, color) in zip(column_tops, phases):
+                if top < bottom:
+                    pg.draw.line(surface, color, (x, bottom - 1), (x, top))
+                bottom = top
+            x += 1
+    target_y = PROFILER_GRAPH_HEIGHT - int(PROFILER_GRAPH_HEIGHT * (1000.0 / 60) / PROFILER_GRAPH_MS)
+    pg.draw.line(surface, (255, 255, 255), (0, target_y), (width, target_y))
+    
+    # p50 / p95 / p99 per scope
+    text_y = PROFILER_GRAPH_HEIGHT + 4
+    for name, (p50, p95, p99) in profiler.percentiles().items():
+        render_text(f"{name}: {p50:.1f} / {p95:.1f} / {p99:.1f} ms", (4, text_y), 18, surface=surface)
+        text_y += 15
+    
+    # Counters
+    if scene_renderer is not None:
+        stats = scene_renderer.stats
+        render_text(f"objects: {stats['drawn']} drawn, {stats['culled']} culled, {stats['cells_drawn']} cells",
+                    (4, text_y), 18, surface=surface)
+        text_y += 15
+    if terrain_renderer is not None:
+        stats = terrain_renderer.stats
+        render_text(f"terrain: {stats['tiles_drawn']} tiles, {stats['triangles']} triangles",
+                    (4, text_y), 18, surface=surface)
+        text_y += 15
+    render_text(f"pick BVH: {interaction_bvh.rebuilds} rebuilds, {interaction_bvh.refits} refits",
+                (4, text_y), 18, surface=surface)
+    text_y += 15
+    if herd_worker is None:
+        for bucket, stats in animal_herd.lod_stats.items():
+            render_text(f"AI {bucket}: {stats['updated']} / {stats['count']} stepped, {stats['ms']:.2f} ms",
+                        (4, text_y), 18, surface=surface)
+            text_y += 15
+    cache = text_cache.stats()
+    render_text(f"text cache: {cache['hits']} hits, {cache['misses']} misses, {cache['entries']} entries",
+                (4, text_y), 18, surface=surface)
+    text_y += 15
+    if herd_worker is not None:
+        render_text(f"AI worker: {herd_worker.rate:.1f} steps/s, {herd_worker.step_ms:.2f} ms/step "
+                    f"({animal_herd.count} animals)", (4, text_y), 18, surface=surface)
+
+def inventory_state():
+    return tuple(player_inventory.items()) if show_inventory else None
+
+def draw_inventory(surface, items):
     # Draw inventory background
-    inventory_width = 600
-    inventory_height = 400
-    inventory_x = (SCREEN_WIDTH - inventory_width) // 2
-    inventory_y = (SCREEN_HEIGHT - inventory_height) // 2
+    inventory_width, inventory_height = surface.get_size()
     
-    pg.draw.rect(screen, (50, 50, 50, 200), (inventory_x, inventory_y, inventory_width, inventory_height))
-    pg.draw.rect(screen, (200, 200, 200), (inventory_x, inventory_y, inventory_width, inventory_height), 2)
+    pg.draw.rect(surface, (50, 50, 50, 200), (0, 0, inventory_width, inventory_height))
+    pg.draw.rect(surface, (200, 200, 200), (0, 0, inventory_width, inventory_height), 2)
     
-    render_text("Inventory (Press TAB to close)", (inventory_x + 10, inventory_y + 10), 30, (255, 255, 255))
+    render_text("Inventory (Press TAB to close)", (10, 10), 30, (255, 255, 255), surface)
     render_text("Hold SHIFT + Left-click to move items between inventory and quick bar", 
-               (inventory_x + 10, inventory_y + 40), 20, (200, 200, 200))
+               (10, 40), 20, (200, 200, 200), surface)
     
     # Draw inventory items
-    item_y = inventory_y + 80
+    item_y = 80
     col = 0
-    for item, amount in sorted(player_inventory.items()):
+    for item, amount in sorted(items):
         if amount > 0:  # Only show items we have
-            item_x = inventory_x + 20 + col * 200
+            item_x = 20 + col * 200
             
-            pg.draw.rect(screen, (70, 70, 70), (item_x, item_y, 180, 30))
-            render_text(f"{item}: {amount}", (item_x + 10, item_y + 5), 25)
+            pg.draw.rect(surface, (70, 70, 70), (item_x, item_y, 180, 30))
+            render_text(f"{item}: {amount}", (item_x + 10, item_y + 5), 25, surface=surface)
             
             col = (col + 1) % 3
             if col == 0:
                 item_y += 40
 
-def draw_crafting_menu():
+def crafting_menu_layout():
+    # (recipe, requirements, y) for each entry, in menu coordinates
+    item_y = 60
+    for item, requirements in crafting_recipes.items():
+        yield item, requirements, item_y
+        item_y += 30 + 25 * len(requirements) + 20
+
+def crafting_button_rect(item_y):
+    return pg.Rect(CRAFTING_MENU_RECT[2] - 100, item_y, 80, 30)
+
+def crafting_menu_state():
+    return tuple(player_inventory.counts.tolist()) if crafting_menu_open else None
+
+def draw_crafting_menu(surface, value):
     # Draw crafting menu background
-    menu_width = 500
-    menu_height = 500
-    menu_x = (SCREEN_WIDTH - menu_width) // 2
-    menu_y = (SCREEN_HEIGHT - menu_height) // 2
+    menu_width, menu_height = surface.get_size()
     
-    pg.draw.rect(screen, (50, 50, 60, 200), (menu_x, menu_y, menu_width, menu_height))
-    pg.draw.rect(screen, (180, 180, 200), (menu_x, menu_y, menu_width, menu_height), 2)
+    pg.draw.rect(surface, (50, 50, 60, 200), (0, 0, menu_width, menu_height))
+    pg.draw.rect(surface, (180, 180, 200), (0, 0, menu_width, menu_height), 2)
     
-    render_text("Crafting Menu (Press C to close)", (menu_x + 10, menu_y + 10), 30, (255, 255, 255))
+    render_text("Crafting Menu (Press C to close)", (10, 10), 30, (255, 255, 255), surface)
     
     # Draw craftable items
-    item_y = menu_y + 60
-    for item, requirements in crafting_recipes.items():
+    craftable = recipe_book.craftable_counts(player_inventory)
+    for row, (item, requirements, item_y) in enumerate(crafting_menu_layout()):
         # Check if player has the required materials
-        can_craft = True
-        for req_item, req_amount in requirements.items():
-            if player_inventory.get(req_item, 0) < req_amount:
-                can_craft = False
-                break
+        can_craft = craftable[row] > 0
         
         # Show the item with its requirements
         color = (255, 255, 255) if can_craft else (150, 150, 150)
-        render_text(f"{item}:", (menu_x + 20, item_y), 25, color)
+        render_text(f"{item}:", (20, item_y), 25, color, surface)
         
         # List requirements
         req_y = item_y + 30
         for req_item, req_amount in requirements.items():
             current_amount = player_inventory.get(req_item, 0)
             req_color = (255, 255, 255) if current_amount >= req_amount else (255, 100, 100)
-            render_text(f"- {req_item}: {current_amount}/{req_amount}", (menu_x + 40, req_y), 20, req_color)
+            render_text(f"- {req_item}: {current_amount}/{req_amount}", (40, req_y), 20, req_color, surface)
             req_y += 25
         
         # Draw craft button if can craft
         if can_craft:
-            button_x = menu_x + menu_width - 100
-            button_y = item_y
-            pg.draw.rect(screen, (100, 150, 100), (button_x, button_y, 80, 30))
-            render_text("Craft", (button_x + 20, button_y + 5), 25)
-            
-            # Check if the button is clicked
-            mouse_pos = pg.mouse.get_pos()
-            if pg.mouse.get_pressed()[0] and button_x <= mouse_pos[0] <= button_x + 80 and button_y <= mouse_pos[1] <= button_y + 30:
-                craft_item(item)
-        
-        item_y = req_y + 20
+            button = crafting_button_rect(item_y)
+            pg.draw.rect(surface, (100, 150, 100), button)
+            render_text("Craft", (button.x + 20, button.y + 5), 25, surface=surface)
 
-def craft_item(item):
-    global player_inventory, player_quick_bar
+def click_crafting_menu(pos):
+    # Craft the recipe whose button is under a click at screen position pos
+    menu_x, menu_y = CRAFTING_MENU_RECT[:2]
+    for item, requirements, item_y in crafting_menu_layout():
+        if crafting_button_rect(item_y).collidepoint(pos[0] - menu_x, pos[1] - menu_y):
+            return craft_item(item)
+    return False
+
+def build_hud():
+    return HudLayer((SCREEN_WIDTH, SCREEN_HEIGHT), [
+        HudWidget((SCREEN_WIDTH // 2 - 10, SCREEN_HEIGHT // 2 - 10, 21, 21), lambda: True, paint_crosshair),
+        HudWidget(QUICK_BAR_RECT, lambda: (tuple(player_quick_bar), selected_slot), paint_quick_bar),
+        *(stat_bar_widget(row, *bar) for row, bar in enumerate(STAT_BARS)),
+        HudWidget((SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 + 50, 500, 30), prompt_state, paint_prompt),
+        HudWidget(INVENTORY_RECT, inventory_state, draw_inventory),
+        HudWidget(CRAFTING_MENU_RECT, crafting_menu_state, draw_crafting_menu),
+        HudWidget(COOKING_PANEL_RECT, cooking_state, paint_cooking),
+        HudWidget(PROFILER_RECT, profiler_state, paint_profiler),
+    ])
+
+hud = None  # HudLayer, built on first draw once pygame and GL are up
+hud_texture = None
+
+def draw_ui():
+    global hud, hud_texture
+    # Switch to 2D mode for UI
+    glMatrixMode(GL_PROJECTION)
+    glPushMatrix()
+    glLoadIdentity()
+    glOrtho(0, SCREEN_WIDTH, SCREEN_HEIGHT, 0, -1, 1)
+    glMatrixMode(GL_MODELVIEW)
+    glPushMatrix()
+    glLoadIdentity()
+    glDisable(GL_DEPTH_TEST)
     
-    # Check if we have the required materials
-    requirements = crafting_recipes[item]
-    for req_item, req_amount in requirements.items():
-        if player_inventory.get(req_item, 0) < req_amount:
-            return False
+    # 2D elements are drawn with Pygame into the overlay, which goes on top
+    # of the 3D scene as one textured quad
+    if hud is None:
+        # Both start out fully transparent, so only dirty rects ever differ
+        hud = build_hud()
+        hud_texture = HudTexture(SCREEN_WIDTH, SCREEN_HEIGHT)
+    hud_texture.upload(hud.surface, hud.update())
+    hud_texture.draw()
     
-    # Remove required materials
-    for req_item, req_amount in requirements.items():
-        player_inventory[req_item] -= req_amount
+    # Switch back to 3D mode
+    glEnable(GL_DEPTH_TEST)
+    glMatrixMode(GL_PROJECTION)
+    glPopMatrix()
+    glMatrixMode(GL_MODELVIEW)
+    glPopMatrix()
+
+def craft_item(item, times=1):
+    global player_inventory, player_quick_bar
     
-    # Add the crafted item
-    if item in player_inventory:
-        player_inventory[item] += 1
-    else:
-        player_inventory[item] = 1
+    # Remove required materials and add the crafted item, if we have them
+    if not recipe_book.craft(player_inventory, item, times):
+        return False
     
     # Try to add to quick bar if there's space
     if None in player_quick_bar:
@@ -519,32 +3372,47 @@ def craft_item(item):
     
     return True
 
+# Cooking and boiling run as sim_timers jobs keyed by (campfire, item
+# instance), so any number of items can cook at any number of campfires and
+# keep cooking when the player walks away
+COOK_TIME = 30  # Seconds
+COOKED_RESULTS = {"meat": "cooked_meat", "water": "purified_water"}
+cooking_instance_ids = itertools.count()
+
+def start_cooking(campfire, item, delay=COOK_TIME):
+    key = (campfire, next(cooking_instance_ids))
+    return sim_timers.schedule(key, delay, finish_cooking, owner=campfire, payload=item)
+
+def finish_cooking(job):
+    result = COOKED_RESULTS[job.payload]
+    player_inventory[result] = player_inventory.get(result, 0) + 1
+
 def interact_with_object(obj):
-    global player_inventory, player_quick_bar, player_near_campfire
+    global player_inventory, player_quick_bar, player_near_campfire, nearby_campfire
     
     if obj.type == "tree":
         # Check if player has an axe equipped
         if player_quick_bar[selected_slot] == "axe":
-            player_inventory["wood"] = player_inventory.get("wood", 0) + random.randint(2, 5)
-            # Trees would be removed or marked as harvested
+            player_inventory["wood"] = player_inventory.get("wood", 0) + game_rng.randint(2, 5)
+            harvest_object(obj)
     
     elif obj.type == "rock":
         # Check if player has a pick-axe equipped
         if player_quick_bar[selected_slot] == "pick-axe":
-            player_inventory["stone"] = player_inventory.get("stone", 0) + random.randint(2, 4)
-            # Rocks would be removed or marked as harvested
+            player_inventory["stone"] = player_inventory.get("stone", 0) + game_rng.randint(2, 4)
+            harvest_object(obj)
     
     elif obj.type == "grass":
-        player_inventory["grass"] = player_inventory.get("grass", 0) + random.randint(1, 3)
-        # Would remove the grass object
+        player_inventory["grass"] = player_inventory.get("grass", 0) + game_rng.randint(1, 3)
+        harvest_object(obj)
     
     elif obj.type == "metal":
-        player_inventory["scrap_metal"] = player_inventory.get("scrap_metal", 0) + random.randint(1, 2)
-        # Would remove the metal object
+        player_inventory["scrap_metal"] = player_inventory.get("scrap_metal", 0) + game_rng.randint(1, 2)
+        harvest_object(obj)
     
     elif obj.type == "nails":
-        player_inventory["nails"] = player_inventory.get("nails", 0) + random.randint(1, 3)
-        # Would remove the nails object
+        player_inventory["nails"] = player_inventory.get("nails", 0) + game_rng.randint(1, 3)
+        harvest_object(obj)
     
     elif obj.type == "water":
         # Check if player has a canteen equipped
@@ -554,31 +3422,39 @@ def interact_with_object(obj):
     elif obj.type == "animal":
         # Check if player has knife equipped
         if player_quick_bar[selected_slot] == "knife":
-            player_inventory["meat"] = player_inventory.get("meat", 0) + random.randint(1, 3)
-            player_inventory["leather"] = player_inventory.get("leather", 0) + random.randint(1, 2)
-            player_inventory["fat"] = player_inventory.get("fat", 0) + random.randint(0, 2)
-            # Would remove the animal object
+            player_inventory["meat"] = player_inventory.get("meat", 0) + game_rng.randint(1, 3)
+            player_inventory["leather"] = player_inventory.get("leather", 0) + game_rng.randint(1, 2)
+            player_inventory["fat"] = player_inventory.get("fat", 0) + game_rng.randint(0, 2)
+            harvest_object(obj)
     
     elif obj.type in ["barrel", "container"]:
         # Loot the container
         for item, amount in obj.contents.items():
             player_inventory[item] = player_inventory.get(item, 0) + amount
         obj.contents = {}  # Empty the container
+        if world_streamer is not None:
+            world_streamer.record_contents(obj)
     
     elif obj.type == "campfire":
         player_near_campfire = True
+        nearby_campfire = obj
         
         # If player has meat or water and campfire is active, start cooking
         if player_quick_bar[selected_slot] == "meat" and player_inventory["meat"] > 0:
-            cooking_items["meat"] = time.time() + 30  # 30 seconds cooking time
+            start_cooking(obj, "meat")
             player_inventory["meat"] -= 1
         
         elif player_quick_bar[selected_slot] == "canteen" and player_inventory["water"] > 0:
-            cooking_items["water"] = time.time() + 30  # 30 seconds boiling time
+            start_cooking(obj, "water")  # Boiling
             player_inventory["water"] -= 1
 
 def update_game_state(dt):
-    global player_hunger, player_thirst, player_health, player_stamina, player_near_campfire, player_pos
+    global player_hunger, player_thirst, player_health, player_stamina, player_near_campfire, nearby_campfire, player_pos, sim_time
+    
+    sim_time += dt / 1000.0
+    
+    # Fire cooking and other timers that came due this tick
+    sim_timers.advance(dt / 1000.0)
     
     # Gradually decrease player stats
     player_hunger -= 0.01 * dt
@@ -595,29 +3471,173 @@ def update_game_state(dt):
     if player_hunger < 10 or player_thirst < 10:
         player_health -= 0.05 * dt
     
-    # Update animal movement
-    for obj in game_objects:
-        if isinstance(obj, Animal):
-            obj.update(game_objects)
+    # Stream chunks in and out around the player
+    if world_streamer is not None and world_streamer.update(player_pos):
+        refresh_herd_obstacles()
+    
+    # Update animal movement, at a rate that drops off with distance from the player
+    with profiler.scope("animals"):
+        if herd_worker is not None:
+            if herd_worker.sync(animal_herd, sim_time, player_pos):
+                animal_herd.sync_grids((collision_grid, interaction_grid))
+        else:
+            animal_herd.step(sim_time, dt / 1000.0, (collision_grid, interaction_grid), player_pos)
     
     # Reset campfire proximity for this frame
     player_near_campfire = False
+    nearby_campfire = None
     
-    # Check if player is near a campfire
-    for obj in game_objects:
-        if obj.type == "campfire":
-            distance = np.linalg.norm(np.array(player_pos) - obj.position)
-            if distance < obj.size + 3:  # Within range of campfire
-                player_near_campfire = True
-                break
+    # Check if player is near a campfire (within 3 units of its edge)
+    campfire = game_objects.nearest_of_type("campfire", player_pos, 3, interaction_grid)
+    if campfire is not None:
+        player_near_campfire = True
+        nearby_campfire = campfire
+
+# One tick of player input. The live game fills it from pygame; headless
+# runs build it from a script, so handle_input never touches the display.
+class HeldKeys(frozenset):
+    # Indexable like pg.key.get_pressed(): keys[K_w] -> bool
+    def __getitem__(self, key):
+        return key in self
+
+class InputFrame:
+    def __init__(self, keys=HeldKeys(), mouse=(0, 0), events=(), mods=0):
+        self.keys = keys
+        self.mouse = mouse
+        self.events = events
+        self.mods = mods
+
+def poll_input():
+    return InputFrame(pg.key.get_pressed(), pg.mouse.get_rel(), pg.event.get(), pg.key.get_mods())
+
+# Input recordings: the seed and world size a session started from plus every
+# sim tick's InputFrame. Held keys are packed into a bitmask over
+# RECORDED_KEYS and only the events handle_input acts on are kept, in one
+# flat table, so a session costs a few bytes per tick. Everything random is
+# seeded, so feeding the frames back through handle_input and
+# update_game_state reproduces the session exactly; a digest of the final
+# state is stored to check that. Quicksave and quickload (UNRECORDED_KEYS)
+# are never recorded or replayed, since they touch the real save file, and
+# quickload is refused while recording: the replay could not follow it.
+REPLAY_MAGIC = "claudesurv-replay"
+REPLAY_VERSION = 1
+RECORDED_KEYS = (K_w, K_s, K_a, K_d, K_LSHIFT)
+UNRECORDED_KEYS = (K_F5, K_F9)
+recording = False  # True while an InputRecorder captures the session
+
+class InputRecorder:
+    def __init__(self, seed, object_count=None):
+        self.seed = seed
+        self.object_count = object_count
+        self.keys = []  # Bitmask over RECORDED_KEYS per tick
+        self.mouse = []
+        self.mods = []
+        self.events = []  # (tick, type, key or button, x, y)
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def record(self, frame):
+        tick = len(self.keys)
+        mask = 0
+        for bit, key in enumerate(RECORDED_KEYS):
+            if frame.keys[key]:
+                mask |= 1 << bit
+        self.keys.append(mask)
+        self.mouse.append(frame.mouse)
+        self.mods.append(frame.mods)
+        for event in frame.events:
+            if event.type == pg.KEYDOWN:
+                if event.key not in UNRECORDED_KEYS:
+                    self.events.append((tick, event.type, event.key, 0, 0))
+            elif event.type == pg.MOUSEBUTTONDOWN:
+                self.events.append((tick, event.type, event.button, event.pos[0], event.pos[1]))
+    
+    def save(self, path, digest):
+        header = {"seed": self.seed, "object_count": self.object_count, "sim_hz": SIM_HZ, "digest": digest}
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                magic=np.array(REPLAY_MAGIC),
+                version=np.array(REPLAY_VERSION),
+                header=np.array(json.dumps(header)),
+                keys=np.array(self.keys, dtype=np.uint8),
+                mouse=np.array(self.mouse, dtype=np.int32).reshape(-1, 2),
+                mods=np.array(self.mods, dtype=np.uint16),
+                events=np.array(self.events, dtype=np.int32).reshape(-1, 5),
+            )
+
+class InputReplay:
+    def __init__(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            if "magic" not in data or str(data["magic"]) != REPLAY_MAGIC:
+                raise ValueError(f"{path} is not an input recording")
+            version = int(data["version"])
+            if version != REPLAY_VERSION:
+                raise ValueError(f"{path} has recording version {version}, expected {REPLAY_VERSION}")
+            columns = {name: data[name] for name in data.files}
+        header = json.loads(str(columns["header"]))
+        if header["sim_hz"] != SIM_HZ:
+            raise ValueError(f"{path} was recorded at {header['sim_hz']} Hz, the sim runs at {SIM_HZ} Hz")
+        self.seed = header["seed"]
+        self.object_count = header["object_count"]
+        self.digest = header["digest"]
+        
+        # Decode every frame up front so replay timing measures the game only
+        held = {}
+        for mask in np.unique(columns["keys"]).tolist():
+            held[mask] = HeldKeys(key for bit, key in enumerate(RECORDED_KEYS) if mask >> bit & 1)
+        events = {}
+        for tick, event_type, code, x, y in columns["events"].tolist():
+            if event_type == pg.KEYDOWN:
+                if code in UNRECORDED_KEYS:
+                    continue  # Older recordings kept them
+                event = pg.event.Event(event_type, key=code)
+            else:
+                event = pg.event.Event(event_type, button=code, pos=(x, y))
+            events.setdefault(tick, []).append(event)
+        self.frames = [InputFrame(held[mask], (dx, dy), events.get(tick, ()), mods)
+                       for tick, (mask, (dx, dy), mods) in enumerate(zip(columns["keys"].tolist(),
+                                                                         columns["mouse"].tolist(),
+                                                                         columns["mods"].tolist()))]
+    
+    def __len__(self):
+        return len(self.frames)
 
-def handle_input(dt):
-    global player_pos, player_rot, show_inventory, crafting_menu_open, selected_slot
+def state_digest():
+    # Hash of the sim state a replay has to reproduce bit for bit
+    digest = hashlib.sha1()
+    digest.update(np.array(list(player_pos) + list(player_rot) + [player_health, player_hunger, player_thirst,
+                                                                  player_stamina, sim_time, selected_slot]).tobytes())
+    digest.update(player_inventory.counts.tobytes())
+    digest.update(animal_herd.positions[:animal_herd.count].tobytes())
+    digest.update(game_objects.flags[:game_objects.count].tobytes())
+    return digest.hexdigest()
+
+def report_replay(replay, frame_times, label):
+    # frame_times in seconds, one per replayed frame
+    ms = np.asarray(frame_times) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    print(f"{len(ms)} {label}: mean {ms.mean():.3f} ms, p50 {p50:.3f}, p95 {p95:.3f}, p99 {p99:.3f}, "
+          f"max {ms.max():.3f} ms")
+    match = state_digest() == replay.digest
+    print("final state matches the recording" if match else "final state DIFFERS from the recording")
+    return match
+
+def handle_input(dt, frame=None):
+    global player_pos, player_prev_pos, player_rot, player_stamina, show_inventory, crafting_menu_open, selected_slot
+    global show_profiler
+    
+    if frame is None:
+        frame = poll_input()
     
-    # Mouse input for camera rotation
-    mouse_dx, mouse_dy = pg.mouse.get_rel()
-    player_rot[0] += mouse_dx * MOUSE_SENSITIVITY * dt
-    player_rot[1] += mouse_dy * MOUSE_SENSITIVITY * dt
+    player_prev_pos = list(player_pos)
+    
+    # Mouse input for camera rotation. Deltas are already a distance, so
+    # they are not scaled by dt.
+    mouse_dx, mouse_dy = frame.mouse
+    player_rot[0] += mouse_dx * MOUSE_SENSITIVITY
+    player_rot[1] += mouse_dy * MOUSE_SENSITIVITY
     
     # Clamp vertical rotation to prevent flipping
     player_rot[1] = max(-90, min(90, player_rot[1]))
@@ -636,7 +3656,7 @@ def handle_input(dt):
     ])
     
     # Movement
-    keys = pg.key.get_pressed()
+    keys = frame.keys
     
     movement_speed = PLAYER_SPEED * dt
     move_vector = np.zeros(3)
@@ -655,22 +3675,15 @@ def handle_input(dt):
         move_vector *= 1.5
         player_stamina -= 0.1 * dt
     
-    # Check for collision before moving
+    # Follow the terrain, then check for collision before moving
     new_pos = np.array(player_pos) + move_vector
-    can_move = True
-    
-    for obj in game_objects:
-        if obj.collide:
-            distance = np.linalg.norm(new_pos[:] - obj.position)
-            if distance < (obj.size + 0.5):  # 0.5 is player's "size"
-                can_move = False
-                break
+    new_pos[1] = height_at(new_pos[0], new_pos[2]) + PLAYER_HEIGHT
     
-    if can_move:
+    if not collision_grid.collides(new_pos, 0.5):  # 0.5 is player's "size"
         player_pos = new_pos.tolist()
     
     # Toggle inventory
-    for event in pg.event.get():
+    for event in frame.events:
         if event.type == pg.QUIT:
             pg.quit()
             sys.exit()
@@ -682,73 +3695,132 @@ def handle_input(dt):
                 crafting_menu_open = not crafting_menu_open
                 show_inventory = False
             elif event.key == K_e:
-                # Interact with nearest object
-                nearest_obj = None
-                nearest_distance = float('inf')
-                
-                for obj in game_objects:
-                    if obj.interactable:
-                        distance = np.linalg.norm(np.array(player_pos) - obj.position)
-                        if distance < obj.size + 2 and distance < nearest_distance:  # Within interaction range
-                            nearest_obj = obj
-                            nearest_distance = distance
-                
-                if nearest_obj:
-                    interact_with_object(nearest_obj)
+                # Interact with the object under the crosshair
+                target = look_target(player_pos, player_rot)
+                if target is not None:
+                    interact_with_object(target)
+            elif event.key == K_F5:
+                save_game()
+            elif event.key == K_F9 and os.path.exists(SAVE_PATH):
+                if recording:
+                    print("Quickload is disabled while recording input")
+                else:
+                    load_game()
+            elif event.key == K_F3:
+                show_profiler = not show_profiler
+            elif event.key == K_F4:
+                profiler.dump_csv(PROFILE_DUMP_PATH + ".csv")
+                profiler.dump_json(PROFILE_DUMP_PATH + ".json", {"ai_lod": animal_herd.lod_stats})
             elif event.key >= K_1 and event.key <= K_8:
                 # Select quick bar slot
                 selected_slot = event.key - K_1  # K_1 is 49, so 49-49=0, 50-49=1, etc.
         elif event.type == pg.MOUSEBUTTONDOWN:
-            if event.button == 1 and show_inventory:  # Left click while inventory is open
+            if event.button == 1 and crafting_menu_open:
+                click_crafting_menu(event.pos)
+            elif event.button == 1 and show_inventory:  # Left click while inventory is open
                 # Handle inventory clicks
-                if pg.key.get_mods() & pg.KMOD_SHIFT:  # Shift is held
+                if frame.mods & pg.KMOD_SHIFT:  # Shift is held
                     # Move items between inventory and quick bar
                     # This would need more complex UI handling to determine which item was clicked
                     pass
 
-def main_game_loop():
-    global player_pos, player_health, game_objects
+def main_game_loop(seed=None, object_count=None, record_path=None, replay=None, fast=False):
+    # record_path saves this session's input on exit. replay plays a
+    # recording instead of live input, in real time or, with fast, one sim
+    # tick per frame as fast as possible.
+    global player_pos, player_health, game_objects, herd_worker, recording
+    
+    if replay is not None:
+        seed, object_count = replay.seed, replay.object_count
+    recorder = InputRecorder(seed, object_count) if record_path else None
+    recording = recorder is not None
+    init_world(object_count, seed)
+    init_display()
+    if AI_WORKER and replay is None and recorder is None:
+        herd_worker = HerdWorker()
     
     # Initialize game settings based on player choice
     initialize_game_settings()
     
+    # Fixed-timestep loop: real time accumulates and is consumed in whole
+    # sim ticks, rendering blends between the last two ticks
+    sim_dt = 1.0 / SIM_HZ
+    accumulator = 0.0
     running = True
-    last_time = time.time()
+    last_time = time.perf_counter()
+    tick = 0
+    frame_times = [] if replay is not None else None  # Only replays report them
     
     while running:
-        # Calculate delta time
-        current_time = time.time()
-        dt = (current_time - last_time) * 1000.0  # Convert to milliseconds
+        profiler.begin_frame()
+        current_time = time.perf_counter()
+        accumulator += (current_time - last_time) * TIME_SCALE
         last_time = current_time
+        if fast:
+            accumulator = sim_dt
         
-        # Cap to 60 FPS
-        if dt < 1000.0 / FPS:
-            pg.time.wait(int(1000.0 / FPS - dt))
-            dt = 1000.0 / FPS
+        steps = 0
+        while accumulator >= sim_dt and steps < MAX_CATCHUP_STEPS:
+            if replay is not None:
+                if tick == len(replay) or pg.event.get(pg.QUIT):
+                    running = False
+                    break
+                pg.event.pump()
+                frame = replay.frames[tick]
+            else:
+                frame = poll_input()
+                # Quit between ticks so a recording ends on a whole tick
+                if any(event.type == pg.QUIT for event in frame.events):
+                    running = False
+                    break
+                if recorder is not None:
+                    recorder.record(frame)
+            
+            # Handle input and update game state (dt in milliseconds)
+            with profiler.scope("handle_input"):
+                handle_input(sim_dt * 1000.0, frame)
+            with profiler.scope("update_game_state"):
+                update_game_state(sim_dt * 1000.0)
+            accumulator -= sim_dt
+            steps += 1
+            tick += 1
         
-        # Handle input
-        handle_input(dt)
+        # Too far behind to catch up - drop the backlog instead of spiralling
+        if accumulator >= sim_dt:
+            accumulator = 0.0
         
-        # Update game state
-        update_game_state(dt)
-        
-        # Check if player is dead
-        if player_health <= 0:
+        # Check if player is dead. A replay runs to its last recorded tick
+        # regardless, like replay_headless, so both end in the same state.
+        if player_health <= 0 and replay is None:
             print("Game over! You died.")
             running = False
         
         # Render the scene
-        render_scene()
+        with profiler.scope("render_scene"):
+            render_scene(accumulator / sim_dt)
         
         # Update display
-        pg.display.flip()
-        clock.tick(FPS)
-    
+        with profiler.scope("flip"):
+            pg.display.flip()
+        profiler.end_frame()
+        if frame_times is not None:
+            frame_times.append(profiler.samples[profiler.row, 0])
+        if FPS and not fast:
+            clock.tick(FPS)
+    
+    if recorder is not None:
+        recorder.save(record_path, state_digest())
+    if replay is not None:
+        report_replay(replay, frame_times, "frames")
+    if herd_worker is not None:
+        herd_worker.update_rate(0.0)
+        print(f"AI worker: {herd_worker.rate:.1f} steps/s, {herd_worker.step_ms:.2f} ms/step")
+        herd_worker.stop()
     pg.quit()
     sys.exit()
 
 def initialize_game_settings():
-    global player_pos, player_inventory, PLAYER_SPEED, PLAYER_HEIGHT
+    global player_pos, player_prev_pos, player_inventory, PLAYER_SPEED, PLAYER_HEIGHT
     
     # In a real game, this would show a UI for the player to select settings
     # For this example, we'll use default values
@@ -775,9 +3847,13 @@ def initialize_game_settings():
     PLAYER_HEIGHT = 1.8
     
     # Place player in a safe starting location
-    player_pos = [0, PLAYER_HEIGHT, 0]
+    player_pos = [0, height_at(0, 0) + PLAYER_HEIGHT, 0]
+    player_prev_pos = list(player_pos)
 
-def render_scene():
+def render_scene(alpha=1.0):
+    # alpha blends between the previous and current sim tick
+    eye = [a + (b - a) * alpha for a, b in zip(player_prev_pos, player_pos)]
+    
     # Clear the screen
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
     glLoadIdentity()
@@ -787,42 +3863,169 @@ def render_scene():
     glRotatef(-player_rot[0], 0, 1, 0)
     
     # Apply camera translation
-    glTranslatef(-player_pos[0], -player_pos[1], -player_pos[2])
+    glTranslatef(-eye[0], -eye[1], -eye[2])
     
-    # Draw the ground (simple grid)
-    draw_ground()
-    
-    # Draw all objects
-    for obj in game_objects:
-        obj.draw()
+    # Draw the terrain tiles and then the objects that survive frustum and
+    # distance culling
+    draw_distance = min(DRAW_DISTANCE, FAR_CLIP)
+    planes = frustum_planes(eye, player_rot, FOV, SCREEN_WIDTH / SCREEN_HEIGHT, NEAR_CLIP, draw_distance)
+    terrain_renderer.draw(terrain, planes, eye, draw_distance)
+    scene_renderer.draw(planes, eye, draw_distance, animal_herd, alpha)
     
     # Draw UI elements
-    draw_ui()
+    with profiler.scope("draw_ui"):
+        draw_ui()
 
-def draw_ground():
-    # Draw a simple grid as the ground
-    glBegin(GL_LINES)
-    glColor3f(0.3, 0.3, 0.3)
-    
-    grid_size = 100
-    grid_step = 5
-    
-    for i in range(-grid_size, grid_size + 1, grid_step):
-        glVertex3f(i, 0, -grid_size)
-        glVertex3f(i, 0, grid_size)
-        glVertex3f(-grid_size, 0, i)
-        glVertex3f(grid_size, 0, i)
-    
-    glEnd()
+# Headless simulation: world + sim steps with scripted input, no window or
+# GL context. script(tick) returns the InputFrame for that tick.
+def scripted_walk(tick):
+    # Walk forward while slowly turning, glance up and down, press E now and then
+    events = []
+    if tick % 30 == 0:
+        events.append(pg.event.Event(pg.KEYDOWN, key=K_e))
+    mouse_dy = 2 if (tick // 60) % 2 else -2
+    return InputFrame(HeldKeys((K_w,)), (3, mouse_dy), events)
+
+def run_headless(ticks, object_count=None, seed=0, script=scripted_walk, timings=None, recorder=None):
+    # timings, if given, is a dict that collects per-phase seconds. recorder,
+    # if given, is an InputRecorder that receives every tick's frame.
+    global recording
+    if timings is None:
+        timings = {}
+    recording = recorder is not None
+    
+    start = time.perf_counter()
+    init_world(object_count, seed)
+    initialize_game_settings()
+    timings["generate_world"] = time.perf_counter() - start
+    
+    dt = 1000.0 / SIM_HZ
+    input_time = update_time = 0.0
+    for tick in range(ticks):
+        frame = script(tick)
+        if recorder is not None:
+            recorder.record(frame)
+        t0 = time.perf_counter()
+        handle_input(dt, frame)
+        t1 = time.perf_counter()
+        update_game_state(dt)
+        t2 = time.perf_counter()
+        input_time += t1 - t0
+        update_time += t2 - t1
     
-    # Draw ground plane
-    glBegin(GL_QUADS)
-    glColor3f(0.2, 0.5, 0.2)  # Green for grass
-    glVertex3f(-grid_size, -0.01, -grid_size)
-    glVertex3f(-grid_size, -0.01, grid_size)
-    glVertex3f(grid_size, -0.01, grid_size)
-    glVertex3f(grid_size, -0.01, -grid_size)
-    glEnd()
+    timings["handle_input"] = input_time
+    timings["update_game_state"] = update_time
+    return timings
+
+def replay_headless(replay):
+    # Replay a recording without a window as fast as possible, timing each tick
+    init_world(replay.object_count, replay.seed)
+    initialize_game_settings()
+    dt = 1000.0 / SIM_HZ
+    tick_times = np.zeros(len(replay))
+    for tick, frame in enumerate(replay.frames):
+        start = time.perf_counter()
+        handle_input(dt, frame)
+        update_game_state(dt)
+        tick_times[tick] = time.perf_counter() - start
+    return report_replay(replay, tick_times, "ticks")
+
+def time_interactions(samples):
+    # Average cost of interact_with_object over random interactables
+    rng = random.Random(1)
+    candidates = list(game_objects.handles(game_objects.with_flag(FLAG_INTERACTABLE)))
+    elapsed = 0.0
+    for _ in range(samples):
+        obj = rng.choice(candidates)
+        start = time.perf_counter()
+        interact_with_object(obj)
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+def time_terrain(seed, side=1000.0):
+    # Seconds to mesh a side x side metre block of terrain tiles
+    terrain = Terrain(seed)
+    tiles = int(math.ceil(side / terrain.tile_size))
+    start = time.perf_counter()
+    terrain.meshes(0, 0, tiles, tiles)
+    return time.perf_counter() - start, (tiles * terrain.tile_size) ** 2
+
+def run_benchmark(sizes, ticks, seed=0):
+    mesh_time, area = time_terrain(seed)
+    print(f"terrain: {area / 1e6:.2f} km^2 meshed in {mesh_time * 1000:.1f} ms")
+    print(f"{'objects':>9} {'gen s':>8} {'load s':>8} {'save s':>8} {'ticks/s':>9} {'input ms':>9} {'update ms':>10} "
+          f"{'interact us':>12} {'world MB':>9} {'rss MB':>8}")
+    for size in sizes:
+        tracemalloc.start()
+        timings = run_headless(0, size, seed)
+        _, world_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        # Tick timing runs untraced so tracemalloc overhead doesn't skew it
+        for name, value in run_headless(ticks, size, seed).items():
+            if name != "generate_world":
+                timings[name] = value
+        tick_time = max(timings["handle_input"] + timings["update_game_state"], 1e-9)
+        per_tick = max(ticks, 1)
+        interact_samples = 1000
+        interact_time = time_interactions(interact_samples)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+        
+        # Snapshot round trip of the world just generated, against generate_world
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.npz")
+            start = time.perf_counter()
+            save_game(path)
+            save_time = time.perf_counter() - start
+            start = time.perf_counter()
+            load_game(path)
+            load_time = time.perf_counter() - start
+        
+        print(f"{len(game_objects):>9} {timings['generate_world']:>8.3f} {load_time:>8.3f} {save_time:>8.3f} {ticks / tick_time:>9.1f} "
+              f"{timings['handle_input'] / per_tick * 1000:>9.3f} {timings['update_game_state'] / per_tick * 1000:>10.3f} "
+              f"{interact_time / interact_samples * 1e6:>12.2f} {world_peak / 2**20:>9.1f} {rss:>8.1f}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="3D Survival Game")
+    parser.add_argument("--headless", action="store_true", help="step the simulation without a window")
+    parser.add_argument("--bench", action="store_true", help="report tick throughput for several world sizes")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated world sizes for --bench")
+    parser.add_argument("--objects", type=int, default=None, help="world size for --headless")
+    parser.add_argument("--ticks", type=int, default=300, help="simulation ticks to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="world generation processes (default: all cores)")
+    parser.add_argument("--record", metavar="PATH", help="record input to PATH (the scripted walk with --headless)")
+    parser.add_argument("--replay", metavar="PATH", help="replay recorded input from PATH and report frame times")
+    parser.add_argument("--fast", action="store_true", help="replay one tick per frame without waiting for real time")
+    parser.add_argument("--ai-worker", action="store_true",
+                        help="step the animals in a separate process (not with --record or --replay)")
+    args = parser.parse_args()
+    # The worker steps the herd on its own clock, so a session it ran can't be replayed bit for bit
+    if args.ai_worker and (args.record or args.replay):
+        parser.error("--ai-worker cannot be combined with --record or --replay")
+    return args
 
 if __name__ == "__main__":
-    main_game_loop()
\ No newline at end of file
+    args = parse_args()
+    WORLDGEN_WORKERS = args.workers
+    AI_WORKER = args.ai_worker
+    if args.bench:
+        run_benchmark([int(size) for size in args.sizes.split(",")], args.ticks, args.seed)
+    elif args.replay and args.headless:
+        sys.exit(0 if replay_headless(InputReplay(args.replay)) else 1)
+    elif args.replay:
+        main_game_loop(replay=InputReplay(args.replay), fast=args.fast)
+    elif args.headless:
+        recorder = InputRecorder(args.seed, args.objects) if args.record else None
+        herd_worker = HerdWorker() if AI_WORKER else None
+        timings = run_headless(args.ticks, args.objects, args.seed, recorder=recorder)
+        tick_time = timings["handle_input"] + timings["update_game_state"]
+        print(f"{len(game_objects)} objects, {args.ticks} ticks, {args.ticks / max(tick_time, 1e-9):.1f} ticks/s")
+        if herd_worker is not None:
+            herd_worker.update_rate(0.0)
+            print(f"AI worker: {herd_worker.rate:.1f} steps/s, {herd_worker.step_ms:.2f} ms/step")
+            herd_worker.stop()
+        if recorder is not None:
+            recorder.save(args.record, state_digest())
+    else:
+        main_game_loop(args.seed, args.objects, args.record)